@@ -0,0 +1,66 @@
+"""
+Chunking throughput benchmark (MB/s) on a synthetic bilingual corpus
+
+Usage: python benchmarks/bench_chunking.py --size-mb 20 --max-tokens 512 --overlap 64
+"""
+
+from pathlib import Path
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chunking import chunk_stream  # noqa: E402
+from corpus import iter_pages  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--max-tokens", type=int, default=512)
+    parser.add_argument("--overlap", type=int, default=64)
+    parser.add_argument("--trace-memory", action="store_true", help="Report peak Python memory (slower)")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    size_bytes = int(args.size_mb * 1024 * 1024)
+    consumed = 0
+
+    def pages():
+        nonlocal consumed
+        for page in iter_pages(size_bytes):
+            consumed += len(page.encode("utf-8"))
+            yield page
+
+    if args.trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    chunks = 0
+    tokens = 0
+    for chunk in chunk_stream(pages(), max_tokens=args.max_tokens, overlap_tokens=args.overlap):
+        chunks += 1
+        tokens += chunk.token_count
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+
+    result = {
+        "benchmark": "chunking",
+        "bytes": consumed,
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(consumed / 1024 / 1024 / elapsed, 2),
+        "chunks": chunks,
+        "avg_tokens_per_chunk": round(tokens / max(chunks, 1), 1),
+        "max_tokens": args.max_tokens,
+        "overlap_tokens": args.overlap,
+        "peak_memory_bytes": peak,
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f"{key:>22}: {value}")
+
+if __name__ == "__main__":
+    main()
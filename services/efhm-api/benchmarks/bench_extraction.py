@@ -0,0 +1,141 @@
+"""
+Extraction throughput benchmark (pages/s per format)
+
+Usage: python benchmarks/bench_extraction.py --pages 200 [--worker]
+
+Synthetic PDFs are written with the base-14 Helvetica font, which cannot
+encode Arabic, so PDF pages use the English half of the corpus only.
+"""
+
+from pathlib import Path
+import argparse
+import json
+import sys
+import tempfile
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from corpus import iter_pages  # noqa: E402
+from extraction import extract, extract_in_worker  # noqa: E402
+
+def _page_texts(count: int):
+    pages = iter_pages(size_bytes=1 << 62, page_chars=2000)
+    return [next(pages) for _ in range(count)]
+
+def write_pdf(path: str, texts):
+    """Write a minimal multi-page PDF with one text line per paragraph"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in texts:
+        lines = [line for line in text.split("\n") if line.strip()]
+        ascii_lines = [line.encode("ascii", "ignore").decode()[:110] for line in lines]
+        ascii_lines = [line for line in ascii_lines if line.strip()] or ["(empty)"]
+        ops = ["BT /F1 9 Tf 40 800 Td 11 TL"]
+        for line in ascii_lines[:60]:
+            safe = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({safe}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    Path(path).write_bytes(bytes(out))
+
+def write_docx(path: str, texts):
+    """Write a minimal DOCX with one paragraph per corpus paragraph"""
+    paragraphs = []
+    for text in texts:
+        for para in text.split("\n\n"):
+            if para.strip():
+                paragraphs.append(f"<w:p><w:r><w:t>{escape(para.strip())}</w:t></w:r></w:p>")
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{''.join(paragraphs)}</w:body></w:document>"
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", '<?xml version="1.0"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"/>')
+        archive.writestr("word/document.xml", document)
+
+def write_xlsx(path: str, texts):
+    """Write an XLSX with one row per sentence"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Claims")
+    for i, text in enumerate(texts):
+        for j, sentence in enumerate(text.split(". ")):
+            sheet.append([i, j, sentence.strip()])
+    workbook.save(path)
+
+def write_txt(path: str, texts):
+    Path(path).write_text("".join(texts), encoding="utf-8")
+
+def write_json(path: str, texts):
+    Path(path).write_text(json.dumps({"pages": [{"text": t} for t in texts]}, ensure_ascii=False), encoding="utf-8")
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "xlsx": write_xlsx, "txt": write_txt, "json": write_json}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=200, help="Synthetic corpus pages per document")
+    parser.add_argument("--formats", default=",".join(WRITERS))
+    parser.add_argument("--worker", action="store_true", help="Extract in the resource-limited worker process")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    texts = _page_texts(args.pages)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.formats.split(","):
+            path = str(Path(tmp) / f"bench.{fmt}")
+            WRITERS[fmt](path, texts)
+            start = time.perf_counter()
+            runner = extract_in_worker if args.worker else extract
+            units = 0
+            chars = 0
+            for page in runner(path, fmt):
+                units += 1
+                chars += len(page.text)
+            elapsed = time.perf_counter() - start
+            results.append({
+                "benchmark": "extraction",
+                "format": fmt,
+                "worker": args.worker,
+                "file_bytes": Path(path).stat().st_size,
+                "units": units,
+                "chars": chars,
+                "seconds": round(elapsed, 3),
+                "pages_per_s": round(units / elapsed, 1),
+                "source_pages_per_s": round(args.pages / elapsed, 1),
+            })
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"{'format':>6} {'units':>6} {'seconds':>8} {'units/s':>9} {'src pages/s':>12}")
+        for r in results:
+            print(f"{r['format']:>6} {r['units']:>6} {r['seconds']:>8} {r['pages_per_s']:>9} {r['source_pages_per_s']:>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Retrieval quality vs latency benchmark
+
+Builds workspaces from a synthetic bilingual healthcare corpus with labelled
+question -> passage pairs, then reports recall@k, MRR, p50/p99 query latency,
+index build time and memory footprint for each configuration.
+
+Usage: python benchmarks/bench_retrieval.py --docs 400 --workspaces 4 \\
+           --chunk-tokens 128,256,512 --modes lexical,dense,hybrid \\
+           --vector-dtypes float32,int8 --output results.json
+"""
+
+from datetime import datetime
+from pathlib import Path
+import argparse
+import functools
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chunking import chunk_text  # noqa: E402
+from corpus import make_labelled_corpus  # noqa: E402
+from retrieval import WorkspaceIndex  # noqa: E402
+import vectors  # noqa: E402
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def build_workspaces(docs, num_workspaces, chunk_tokens, overlap, index_factory=WorkspaceIndex):
+    """Chunk and index documents round-robin into workspaces; returns (indexes, doc->ws, seconds)"""
+    indexes = [index_factory(f"ws_bench_{w}") for w in range(num_workspaces)]
+    placement = {}
+    start = time.perf_counter()
+    for i, (doc_id, text) in enumerate(docs.items()):
+        w = i % num_workspaces
+        indexes[w].add_document(doc_id, chunk_text(text, max_tokens=chunk_tokens, overlap_tokens=overlap))
+        placement[doc_id] = w
+    return indexes, placement, time.perf_counter() - start
+
+def evaluate(indexes, placement, questions, ks, mode, **search_kwargs):
+    """Run every question against its workspace and compute recall@k, MRR and latency"""
+    max_k = max(ks)
+    hits_at = {k: 0 for k in ks}
+    reciprocal_ranks = []
+    latencies = []
+    for q in questions:
+        index = indexes[placement[q["document_id"]]]
+        start = time.perf_counter()
+        results = index.search(q["question"], top_k=max_k, mode=mode, **search_kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+        rank = None
+        for position, hit in enumerate(results, start=1):
+            if hit.document_id == q["document_id"] and q["passage"] in hit.chunk.text:
+                rank = position
+                break
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+        for k in ks:
+            if rank and rank <= k:
+                hits_at[k] += 1
+    n = len(questions)
+    return {
+        **{f"recall@{k}": round(hits_at[k] / n, 4) for k in ks},
+        f"mrr@{max_k}": round(sum(reciprocal_ranks) / n, 4),
+        "latency_p50_ms": round(_percentile(latencies, 0.50), 3),
+        "latency_p99_ms": round(_percentile(latencies, 0.99), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality vs latency benchmark")
+    parser.add_argument("--docs", type=int, default=400)
+    parser.add_argument("--workspaces", type=int, default=4)
+    parser.add_argument("--chunk-tokens", default="128,256,512")
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--modes", default="lexical,dense,hybrid")
+    parser.add_argument("--vector-dtypes", default="float32", help="Vector storage per workspace: float32,float16,int8")
+    parser.add_argument("--no-rescore", action="store_true", help="Search compact vectors without exact rescoring")
+    parser.add_argument("--k", default="1,5,10", help="Cut-offs for recall@k")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    ks = [int(k) for k in args.k.split(",")]
+    docs, questions = make_labelled_corpus(args.docs, seed=args.seed)
+    results = []
+    vectors.VECTOR_RESCORE_DIR = tempfile.mkdtemp(prefix="efhm-bench-vectors-")
+    for chunk_tokens in [int(t) for t in args.chunk_tokens.split(",")]:
+        for dtype in args.vector_dtypes.split(","):
+            factory = functools.partial(WorkspaceIndex, vector_dtype=dtype, rescore=not args.no_rescore)
+            indexes, placement, build_seconds = build_workspaces(
+                docs, args.workspaces, chunk_tokens, min(args.overlap, chunk_tokens // 2), index_factory=factory
+            )
+            chunks = sum(len(index) for index in indexes)
+            memory = sum(index.memory_bytes() for index in indexes)
+            vector_bytes = indexes[0].vectors.bytes_per_vector
+            for mode in args.modes.split(","):
+                metrics = evaluate(indexes, placement, questions, ks, mode)
+                results.append({
+                    "chunk_tokens": chunk_tokens,
+                    "vector_dtype": dtype,
+                    "rescore": not args.no_rescore and dtype != "float32",
+                    "mode": mode,
+                    "chunks": chunks,
+                    "index_build_s": round(build_seconds, 3),
+                    "index_memory_bytes": memory,
+                    "vector_memory_per_million_mb": round(vector_bytes * 1_000_000 / 1024 / 1024, 1),
+                    **metrics,
+                })
+                print(" ".join(f"{key}={value}" for key, value in results[-1].items()))
+
+    report = {
+        "benchmark": "retrieval",
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "params": {"docs": args.docs, "workspaces": args.workspaces, "questions": len(questions), "seed": args.seed},
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
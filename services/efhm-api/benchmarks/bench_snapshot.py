@@ -0,0 +1,114 @@
+"""
+Workspace snapshot benchmark: time-to-ready of a node by rebuild vs mapped snapshots
+
+Usage: python benchmarks/bench_snapshot.py --workspaces 500 --docs-per-workspace 4 --output snapshot.json
+
+"rebuild" chunks and indexes every workspace from extracted text, a lower
+bound for recovery from Postgres or re-extraction. "mapped" maps the exported
+snapshots with header checks only, and "verified" also checksums every
+section. First-query latency includes decoding the touched pages. The files
+were just written, so they are in the page cache; on a cold replica the first
+queries also pay for disk reads.
+"""
+
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_retrieval import build_workspaces  # noqa: E402
+from corpus import make_labelled_corpus  # noqa: E402
+from retrieval import WorkspaceIndex  # noqa: E402
+from snapshot import export_workspaces, load_snapshot_dir  # noqa: E402
+from vectors import VECTOR_DTYPES  # noqa: E402
+import vectors  # noqa: E402
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _query_latencies(indexes, questions, placement, mode, top_k):
+    """Per-question latency (ms) and the returned chunk ids"""
+    latencies, results = [], []
+    for q in questions:
+        index = indexes[f"ws_bench_{placement[q['document_id']]}"]
+        start = time.perf_counter()
+        hits = index.search(q["question"], top_k=top_k, mode=mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([hit.chunk_id for hit in hits])
+    return latencies, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Workspace snapshot time-to-ready benchmark")
+    parser.add_argument("--workspaces", type=int, default=500)
+    parser.add_argument("--docs-per-workspace", type=int, default=4)
+    parser.add_argument("--chunk-tokens", type=int, default=256)
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--vector-dtype", default="float32", choices=VECTOR_DTYPES)
+    parser.add_argument("--mode", default="hybrid", choices=("lexical", "dense", "hybrid"))
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=17)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    docs, questions = make_labelled_corpus(args.workspaces * args.docs_per_workspace, seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        vectors.VECTOR_RESCORE_DIR = str(Path(tmp) / "rescore")
+        snapshot_dir = str(Path(tmp) / "snapshots")
+
+        built, placement, rebuild_s = build_workspaces(
+            docs, args.workspaces, args.chunk_tokens, args.overlap,
+            index_factory=lambda ws: WorkspaceIndex(ws, vector_dtype=args.vector_dtype),
+        )
+        built = {index.workspace_id: index for index in built}
+        _, expected = _query_latencies(built, questions, placement, args.mode, args.top_k)
+
+        start = time.perf_counter()
+        written = export_workspaces(built, snapshot_dir)
+        export_s = time.perf_counter() - start
+        del built
+
+        results = {
+            "workspaces": args.workspaces,
+            "chunks": None,
+            "snapshot_mb": round(sum(written.values()) / 1024 / 1024, 2),
+            "rebuild_s": round(rebuild_s, 3),
+            "export_s": round(export_s, 3),
+        }
+        for label, verify in (("mapped", False), ("verified", True)):
+            start = time.perf_counter()
+            indexes = load_snapshot_dir(snapshot_dir, verify=verify)
+            ready_s = time.perf_counter() - start
+            # First question per workspace touches its pages for the first time
+            first, seen = [], set()
+            for q in questions:
+                w = placement[q["document_id"]]
+                if w not in seen:
+                    seen.add(w)
+                    first.extend(_query_latencies(indexes, [q], placement, args.mode, args.top_k)[0])
+            latencies, found = _query_latencies(indexes, questions, placement, args.mode, args.top_k)
+            results["chunks"] = sum(len(index) for index in indexes.values())
+            results[f"{label}_ready_s"] = round(ready_s, 4)
+            results[f"{label}_first_query_p50_ms"] = round(_percentile(first, 0.50), 3)
+            results[f"{label}_first_query_p99_ms"] = round(_percentile(first, 0.99), 3)
+            results[f"{label}_query_p50_ms"] = round(_percentile(latencies, 0.50), 3)
+            results[f"{label}_query_p99_ms"] = round(_percentile(latencies, 0.99), 3)
+            results[f"{label}_matches_rebuild"] = found == expected
+        results["speedup"] = round(rebuild_s / max(results["mapped_ready_s"], 1e-9), 1)
+
+    print(" ".join(f"{key}={value}" for key, value in results.items()))
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "benchmark": "snapshot",
+            "timestamp": datetime.utcnow().isoformat(),
+            "params": vars(args),
+            "results": results,
+        }, indent=2), encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
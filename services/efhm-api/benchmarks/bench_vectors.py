@@ -0,0 +1,89 @@
+"""
+Compact vector storage benchmark: memory per million chunks vs recall and latency
+
+Usage: python benchmarks/bench_vectors.py --vectors 200000 --dim 768 --output vectors.json
+
+Recall@k is measured against exact float32 search over the same vectors, so it
+isolates the quantization loss from embedding or chunking quality.
+"""
+
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vectors import VECTOR_DTYPES, VectorStore  # noqa: E402
+
+def synthetic_embeddings(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Unit vectors drawn around random topic centroids, like real chunk embeddings"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centroids[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact vector storage benchmark")
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    vectors = synthetic_embeddings(args.vectors, args.dim, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, args.vectors, args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = [set(np.argsort(-(vectors @ q))[:args.k].tolist()) for q in queries]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in VECTOR_DTYPES:
+            for rescore in ([False, True] if dtype != "float32" else [False]):
+                store = VectorStore(args.dim, dtype, rescore_path=str(Path(tmp) / f"{dtype}.f32") if rescore else None)
+                start = time.perf_counter()
+                for offset in range(0, args.vectors, 4096):
+                    store.add(vectors[offset:offset + 4096])
+                build = time.perf_counter() - start
+                latencies = []
+                found = 0
+                for q, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    ids, _ = store.search(q, args.k, rescore=rescore, rescore_factor=args.rescore_factor)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    found += len(expected.intersection(ids.tolist()))
+                latencies.sort()
+                results.append({
+                    "dtype": dtype,
+                    "rescore": rescore,
+                    "bytes_per_vector": store.bytes_per_vector,
+                    "memory_per_million_mb": round(store.bytes_per_vector * 1_000_000 / 1024 / 1024, 1),
+                    "resident_mb": round(store.nbytes / 1024 / 1024, 1),
+                    f"recall@{args.k}": round(found / (args.k * len(queries)), 4),
+                    "latency_p50_ms": round(latencies[len(latencies) // 2], 3),
+                    "latency_p99_ms": round(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))], 3),
+                    "build_s": round(build, 3),
+                })
+                print(" ".join(f"{key}={value}" for key, value in results[-1].items()))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "benchmark": "vectors",
+            "timestamp": datetime.utcnow().isoformat(),
+            "params": vars(args),
+            "results": results,
+        }, indent=2), encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Synthetic bilingual (Arabic/English) healthcare corpus for EFHM benchmarks
+"""
+
+from typing import Dict, Iterator, List, Tuple
+import random
+
+AR_TERMS = [
+    "المريض", "الطبيب", "المطالبة", "التأمين", "نفيس", "الموافقة المسبقة",
+    "التشخيص", "الوصفة الطبية", "المستشفى", "العيادة", "السكري", "ضغط الدم",
+    "الجرعة", "المختبر", "الأشعة", "الإحالة", "الطوارئ", "التطعيم",
+]
+AR_FILLER = [
+    "يجب", "على", "في", "من", "إلى", "خلال", "حسب", "مع", "قبل", "بعد",
+    "تقديم", "مراجعة", "توثيق", "اعتماد", "متابعة", "الحالة", "السجل", "اليوم",
+]
+EN_TERMS = [
+    "patient", "physician", "claim", "insurance", "NPHIES", "prior authorization",
+    "diagnosis", "prescription", "hospital", "clinic", "diabetes", "hypertension",
+    "dosage", "laboratory", "radiology", "referral", "emergency", "vaccination",
+]
+EN_FILLER = [
+    "must", "be", "the", "within", "for", "each", "according", "to", "with",
+    "before", "after", "submitted", "reviewed", "documented", "approved", "record",
+]
+
+def _sentence(rng: random.Random, arabic: bool) -> str:
+    terms, filler = (AR_TERMS, AR_FILLER) if arabic else (EN_TERMS, EN_FILLER)
+    words = [rng.choice(filler if rng.random() < 0.6 else terms) for _ in range(rng.randint(6, 18))]
+    if not arabic:
+        words[0] = words[0].capitalize()
+    end = rng.choice(["؟", "."] if arabic else ["?", ".", "."])
+    return " ".join(words) + end
+
+def iter_pages(size_bytes: int, seed: int = 7, page_chars: int = 3000) -> Iterator[str]:
+    """Yield pages of mixed Arabic/English text until `size_bytes` of UTF-8 is produced"""
+    rng = random.Random(seed)
+    produced = 0
+    section = 0
+    while produced < size_bytes:
+        lines = []
+        length = 0
+        while length < page_chars:
+            if rng.random() < 0.05:
+                section += 1
+                heading = f"المادة {section}" if rng.random() < 0.5 else f"{section}. Section {section}"
+                lines.append(f"\n{heading}\n")
+            arabic = rng.random() < 0.5
+            paragraph = " ".join(_sentence(rng, arabic) for _ in range(rng.randint(2, 6)))
+            lines.append(paragraph + "\n\n")
+            length += len(paragraph)
+        page = "".join(lines)
+        produced += len(page.encode("utf-8"))
+        yield page
+
+def make_labelled_corpus(
+    num_docs: int, seed: int = 11, sentences_per_doc: int = 40
+) -> Tuple[Dict[str, str], List[Dict[str, str]]]:
+    """
+    Build documents plus labelled question -> passage pairs.
+
+    Each question is a noisy paraphrase of a planted "fact" sentence, and the
+    label is the id of the document containing it together with its text.
+    """
+    rng = random.Random(seed)
+    docs: Dict[str, str] = {}
+    questions: List[Dict[str, str]] = []
+    for d in range(num_docs):
+        doc_id = f"doc_{d}"
+        arabic = d % 2 == 0
+        sentences = [_sentence(rng, arabic) for _ in range(sentences_per_doc)]
+        code = f"{rng.choice('ABCDEFGH')}{rng.randint(100, 999)}"
+        days = rng.randint(3, 90)
+        if arabic:
+            term = rng.choice(AR_TERMS)
+            fact = f"يجب تقديم {term} للرمز {code} خلال {days} يوما."
+            question = f"متى يجب تقديم {term} للرمز {code}؟"
+        else:
+            term = rng.choice(EN_TERMS)
+            fact = f"The {term} for code {code} must be submitted within {days} days."
+            question = f"When must the {term} for code {code} be submitted?"
+        sentences.insert(rng.randrange(len(sentences)), fact)
+        docs[doc_id] = "\n\n".join(
+            " ".join(sentences[i:i + 4]) for i in range(0, len(sentences), 4)
+        )
+        questions.append({
+            "question": question,
+            "document_id": doc_id,
+            "passage": fact,
+            "language": "ar" if arabic else "en",
+        })
+    return docs, questions
@@ -0,0 +1,380 @@
+"""
+EFHM Chunking Engine
+Streaming, sentence- and heading-aware chunking for Arabic and English text
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+import math
+import re
+
+# ============================================================================
+# TOKEN ESTIMATION
+# ============================================================================
+
+# Character counts misjudge Arabic: subword tokenizers split Arabic words into
+# noticeably more pieces than English words of the same length.
+ARABIC_CHARS_PER_TOKEN = 2.5
+LATIN_CHARS_PER_TOKEN = 4.0
+DIGITS_PER_TOKEN = 3.0
+
+_ARABIC_RANGES = "؀-ۿݐ-ݿࢠ-ࣿﭐ-﷿ﹰ-﻿"
+_TOKEN_RUN = re.compile(
+    rf"(?P<ar>[{_ARABIC_RANGES}]+)|(?P<lat>[A-Za-zÀ-ɏ]+)|(?P<num>\d+)|\S"
+)
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the model token cost of text, weighting Arabic script higher"""
+    tokens = 0
+    for match in _TOKEN_RUN.finditer(text):
+        kind = match.lastgroup
+        length = match.end() - match.start()
+        if kind == "ar":
+            tokens += math.ceil(length / ARABIC_CHARS_PER_TOKEN)
+        elif kind == "lat":
+            tokens += math.ceil(length / LATIN_CHARS_PER_TOKEN)
+        elif kind == "num":
+            tokens += math.ceil(length / DIGITS_PER_TOKEN)
+        else:
+            tokens += 1
+    return tokens
+
+# ============================================================================
+# MODELS
+# ============================================================================
+
+@dataclass
+class Chunk:
+    """A token-budgeted chunk with stable offsets into the extracted text"""
+    index: int
+    text: str
+    start: int  # offset of the first character in the concatenated segments
+    end: int  # offset one past the last character
+    token_count: int
+    heading: Optional[str] = None
+    page_start: int = 1
+    page_end: int = 1
+
+@dataclass
+class _Unit:
+    kind: str  # "sentence", "heading" or "break"
+    text: str = ""
+    start: int = 0
+    end: int = 0
+    page: int = 1
+    tokens: int = 0
+
+# ============================================================================
+# SENTENCE / HEADING SEGMENTATION
+# ============================================================================
+
+# Sentence terminators for English and Arabic (؟ question mark, ۔ full stop),
+# optionally followed by closing quotes/brackets, then whitespace.
+_BOUNDARY = re.compile(r"[.!?؟۔…]+[\"'»”)\]]*(?=\s)|\n")
+
+_MARKDOWN_HEADING = re.compile(r"#{1,6}\s+\S")
+_NUMBERED_HEADING = re.compile(r"(?:\d+(?:\.\d+)*[.)]?|[IVXLC]+\.)\s+(?P<title>.+)")
+_AR_ORDINAL = r"ال(?:أول|ثاني|ثالث|رابع|خامس|سادس|سابع|ثامن|تاسع|عاشر)[ىة]?"
+# Keywords are case-sensitive and must be followed by a number, so prose such
+# as "Part of the dose" is not a heading
+_KEYWORD_HEADING = re.compile(
+    r"(?:الفصل|الباب|المادة|القسم|الجزء|Chapter|Section|Article|Part|CHAPTER|SECTION|ARTICLE|PART)"
+    rf"\s+\(?(?:\d+(?:\.\d+)*|[٠-٩]+|[IVXLC]+|{_AR_ORDINAL})\)?"
+    r"(?:\s*[:\-–—.]\s*(?P<title>.+)|\s+(?P<bare>.+))?$"
+)
+# A leading quantity with a unit is a dosage or measurement line, not a heading
+_QUANTITY = re.compile(
+    r"\d+(?:[.,]\d+)?\s*(?:%|mg|mcg|µg|g|kg|ml|l|iu|units?|tablets?|tabs?|capsules?|caps?|drops?"
+    r"|times?|x|hours?|hrs?|days?|weeks?|months?|years?|mmol|meq|sar|riyals?"
+    r"|ملغ|مغ|مل|جرام|غرام|وحدة|وحدات|حبة|حبات|قرص|أقراص|مرة|مرات|ساعة|ساعات|يوم|يوما|أيام|أسبوع|أسابيع|شهر|أشهر|سنة|ريال)(?!\w)",
+    re.IGNORECASE,
+)
+# A title ending in one of these was wrapped mid-sentence (typical of PDF lines)
+_CONTINUATION_WORDS = {
+    "a", "an", "and", "as", "at", "by", "for", "from", "in", "of", "on", "or", "the", "to", "with", "that",
+    "و", "في", "من", "على", "إلى", "عن", "أن", "أو", "مع",
+}
+_ARABIC_LETTER = re.compile(r"[\u0621-\u064A]")
+
+HEADING_MAX_CHARS = 120
+HEADING_TITLE_MAX_CHARS = 80
+HEADING_TITLE_MAX_WORDS = 8
+MAX_SENTENCE_CHARS = 4000
+
+def _is_title(title: str, max_words: int = HEADING_TITLE_MAX_WORDS) -> bool:
+    """Whether the text after a heading number reads like a short title"""
+    words = title.split()
+    if not words or len(words) > max_words or len(title) > HEADING_TITLE_MAX_CHARS:
+        return False
+    if re.search(r"[.!?؟,;،؛]", title) or _QUANTITY.search(title):
+        return False
+    if words[-1].lower() in _CONTINUATION_WORDS:
+        return False
+    first = title[0]
+    return first.isupper() or bool(_ARABIC_LETTER.match(first))
+
+def is_heading(line: str) -> bool:
+    """Detect a heading line in Arabic or English text"""
+    stripped = line.strip()
+    if not stripped or len(stripped) > HEADING_MAX_CHARS or "\t" in line:
+        return False
+    if _MARKDOWN_HEADING.match(stripped):
+        return True
+    if _QUANTITY.match(stripped):
+        return False
+    match = _KEYWORD_HEADING.match(stripped)
+    if match:
+        if match.group("title"):
+            return _is_title(match.group("title"))
+        bare = match.group("bare")
+        # Without a separator, Arabic text cannot be told from running prose by
+        # case, so only very short remainders count
+        return bare is None or _is_title(bare, max_words=3 if _ARABIC_LETTER.match(bare) else HEADING_TITLE_MAX_WORDS)
+    match = _NUMBERED_HEADING.fullmatch(stripped)
+    return bool(match) and _is_title(match.group("title"))
+
+def iter_units(
+    segments: Iterable[str],
+    token_counter: Callable[[str], int] = estimate_tokens,
+) -> Iterator[_Unit]:
+    """
+    Split a stream of text segments (pages, parts, row batches) into sentence,
+    heading and paragraph-break units. Only the unfinished tail of the stream
+    is buffered, so memory does not grow with document size.
+    """
+    buf = ""
+    base = 0  # global offset of buf[0]
+    cur = 0  # start of the open sentence in buf
+    scan = 0  # scan position in buf
+    line_start = True
+    page = 0
+    page_marks: List[Tuple[int, int]] = []  # (global offset, page number)
+
+    def page_at(offset: int) -> int:
+        while len(page_marks) > 1 and page_marks[1][0] <= offset:
+            page_marks.pop(0)
+        return page_marks[0][1] if page_marks else 1
+
+    def make(kind: str, start: int, end: int) -> Optional[_Unit]:
+        raw = buf[start:end]
+        text = raw.strip()
+        if not text:
+            return None
+        lead = len(raw) - len(raw.lstrip())
+        g_start = base + start + lead
+        return _Unit(
+            kind=kind,
+            text=" ".join(text.split()),
+            start=g_start,
+            end=g_start + len(text),
+            page=page_at(g_start),
+            tokens=token_counter(text),
+        )
+
+    iterator = iter(segments)
+    final = False
+    while True:
+        if not final:
+            segment = next(iterator, None)
+            if segment is None:
+                final = True
+            else:
+                page += 1
+                if not segment:
+                    continue
+                buf = buf[cur:] + segment
+                base += cur
+                scan -= cur
+                cur = 0
+                page_marks.append((base + len(buf) - len(segment), page))
+
+        while True:
+            if line_start:
+                nl = buf.find("\n", scan)
+                if nl == -1 and not final and len(buf) - scan < HEADING_MAX_CHARS:
+                    break
+                line_end = nl if nl != -1 else len(buf)
+                line = buf[scan:line_end]
+                if not line.strip():
+                    if nl == -1:
+                        break
+                    unit = make("sentence", cur, scan)
+                    if unit:
+                        yield unit
+                        yield _Unit(kind="break", start=unit.end, end=unit.end)
+                    cur = scan = nl + 1
+                    continue
+                if is_heading(line):
+                    unit = make("sentence", cur, scan)
+                    if unit:
+                        yield unit
+                    heading = make("heading", scan, line_end)
+                    if heading:
+                        yield heading
+                    cur = scan = line_end if nl == -1 else nl + 1
+                    continue
+                line_start = False
+
+            match = _BOUNDARY.search(buf, scan)
+            if match is None:
+                if len(buf) - cur > MAX_SENTENCE_CHARS:
+                    # No boundary in sight; cut at the last whitespace to bound memory
+                    cut = buf.rfind(" ", cur, cur + MAX_SENTENCE_CHARS)
+                    cut = cut if cut > cur else cur + MAX_SENTENCE_CHARS
+                    unit = make("sentence", cur, cut)
+                    if unit:
+                        yield unit
+                    cur = scan = cut
+                    continue
+                scan = max(scan, len(buf) - 8)  # a terminator may straddle segments
+                break
+            if match.group() == "\n":
+                scan = match.end()
+                line_start = True
+                continue
+            unit = make("sentence", cur, match.end())
+            if unit:
+                yield unit
+            cur = scan = match.end()
+
+        if final:
+            unit = make("sentence", cur, len(buf))
+            if unit:
+                yield unit
+            return
+
+# ============================================================================
+# CHUNK PACKING
+# ============================================================================
+
+def _split_oversized(unit: _Unit, max_tokens: int, token_counter: Callable[[str], int]) -> Iterator[_Unit]:
+    """Split a single sentence that exceeds the token budget at word boundaries"""
+    words = list(re.finditer(r"\S+", unit.text))
+    piece_start = 0
+    piece_tokens = 0
+    last_end = 0
+    for word in words:
+        word_tokens = token_counter(word.group())
+        if piece_tokens and piece_tokens + word_tokens > max_tokens:
+            text = unit.text[piece_start:last_end]
+            yield _Unit("sentence", text, unit.start + piece_start, unit.start + last_end, unit.page, piece_tokens)
+            piece_start = word.start()
+            piece_tokens = 0
+        piece_tokens += word_tokens
+        last_end = word.end()
+    if piece_tokens:
+        text = unit.text[piece_start:last_end]
+        yield _Unit("sentence", text, unit.start + piece_start, unit.start + last_end, unit.page, piece_tokens)
+
+def chunk_stream(
+    segments: Iterable[str],
+    max_tokens: int = 512,
+    overlap_tokens: int = 64,
+    token_counter: Callable[[str], int] = estimate_tokens,
+) -> Iterator[Chunk]:
+    """
+    Chunk a stream of extracted text segments into token-budgeted chunks.
+
+    Chunks end on sentence boundaries, headings start a new chunk, and up to
+    `overlap_tokens` of trailing sentences are repeated at the start of the
+    next chunk within the same section. Offsets refer to the concatenation of
+    all segments, so they stay stable across re-chunking with other budgets.
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("overlap_tokens must be between 0 and max_tokens")
+
+    index = 0
+    heading: Optional[_Unit] = None
+    current: List[_Unit] = []
+    current_tokens = 0
+    fresh = 0  # units in `current` that are not overlap from the previous chunk
+
+    def build() -> Chunk:
+        parts = []
+        for unit in current:
+            if unit.kind == "break":
+                if parts and parts[-1] != "\n\n":
+                    parts.append("\n\n")
+            else:
+                if parts and parts[-1] != "\n\n":
+                    parts.append(" ")
+                parts.append(unit.text)
+        body = "".join(parts).strip()
+        text = f"{heading.text}\n\n{body}" if heading else body
+        content = [u for u in current if u.kind != "break"]
+        return Chunk(
+            index=index,
+            text=text,
+            start=content[0].start,
+            end=content[-1].end,
+            token_count=current_tokens + (heading.tokens if heading else 0),
+            heading=heading.text if heading else None,
+            page_start=content[0].page,
+            page_end=content[-1].page,
+        )
+
+    def overlap_tail() -> List[_Unit]:
+        tail: List[_Unit] = []
+        tokens = 0
+        for unit in reversed(current):
+            if unit.kind == "break":
+                continue
+            if tokens + unit.tokens > overlap_tokens:
+                break
+            tail.insert(0, unit)
+            tokens += unit.tokens
+        return tail
+
+    def orphan_heading() -> Chunk:
+        # A heading with no body before the next heading (or the end) is kept
+        # as body text so nothing the document contains is dropped
+        nonlocal heading, current, current_tokens
+        current = [_Unit("sentence", heading.text, heading.start, heading.end, heading.page, heading.tokens)]
+        current_tokens = heading.tokens
+        heading = None
+        return build()
+
+    for unit in iter_units(segments, token_counter):
+        if unit.kind == "heading":
+            if fresh:
+                yield build()
+                index += 1
+            elif heading:
+                yield orphan_heading()
+                index += 1
+            heading = unit
+            current, current_tokens, fresh = [], 0, 0
+            continue
+        if unit.kind == "break":
+            if current:
+                current.append(unit)
+            continue
+
+        budget = max_tokens - (heading.tokens if heading else 0)
+        pieces = [unit] if unit.tokens <= budget else list(
+            _split_oversized(unit, max(budget, 1), token_counter)
+        )
+        for piece in pieces:
+            if fresh and current_tokens + piece.tokens > budget:
+                yield build()
+                index += 1
+                current = overlap_tail()
+                current_tokens = sum(u.tokens for u in current)
+                fresh = 0
+                # Drop overlap that would not leave room for the new sentence
+                while current and current_tokens + piece.tokens > budget:
+                    current_tokens -= current.pop(0).tokens
+            current.append(piece)
+            current_tokens += piece.tokens
+            fresh += 1
+
+    if fresh:
+        yield build()
+    elif heading:
+        yield orphan_heading()
+
+def chunk_text(text: str, **kwargs) -> List[Chunk]:
+    """Chunk an in-memory string; see `chunk_stream` for options"""
+    return list(chunk_stream([text], **kwargs))
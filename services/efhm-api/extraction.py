@@ -0,0 +1,300 @@
+"""
+EFHM Text Extraction
+Page-streaming extractors for every DocumentType, run in a resource-limited worker
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger("efhm.extraction")
+
+# Upload content types mapped to DocumentType values
+CONTENT_TYPES = {
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+    "text/plain": "txt",
+    "application/json": "json",
+}
+
+# Per-document worker limits
+EXTRACTION_CPU_SECONDS = int(os.getenv("EXTRACTION_CPU_SECONDS", "60"))
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "120"))
+EXTRACTION_MAX_MEMORY_MB = int(os.getenv("EXTRACTION_MAX_MEMORY_MB", "1024"))
+
+TEXT_BLOCK_CHARS = 64 * 1024
+DOCX_PARAGRAPHS_PER_BATCH = 200
+XLSX_ROWS_PER_BATCH = 500
+JSON_LINES_PER_BATCH = 500
+
+class ExtractionError(Exception):
+    """Raised when a document cannot be extracted within its limits"""
+
+@dataclass
+class ExtractedPage:
+    """One unit of extracted text: a PDF page, a DOCX part batch or an XLSX row batch"""
+    number: int
+    text: str
+    label: str
+
+# ============================================================================
+# EXTRACTORS
+# ============================================================================
+
+def extract_pdf(path: str) -> Iterator[ExtractedPage]:
+    """Yield PDF text page by page; pypdf only parses a page when it is accessed"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        text = page.extract_text() or ""
+        yield ExtractedPage(number=number, text=text + "\n\n", label=f"page {number}")
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+def _docx_parts(archive: zipfile.ZipFile) -> List[str]:
+    names = set(archive.namelist())
+    parts = ["word/document.xml"] if "word/document.xml" in names else []
+    for prefix in ("word/header", "word/footer", "word/footnotes", "word/endnotes"):
+        parts.extend(sorted(n for n in names if n.startswith(prefix) and n.endswith(".xml")))
+    return parts
+
+def extract_docx(path: str) -> Iterator[ExtractedPage]:
+    """Yield DOCX text part by part, streaming paragraphs with iterparse"""
+    number = 0
+    with zipfile.ZipFile(path) as archive:
+        for part in _docx_parts(archive):
+            with archive.open(part) as stream:
+                paragraphs: List[str] = []
+                batch = 0
+                for _, element in ET.iterparse(stream, events=("end",)):
+                    if element.tag != f"{_W}p":
+                        continue
+                    texts = []
+                    style = None
+                    for node in element.iter():
+                        if node.tag == f"{_W}t" and node.text:
+                            texts.append(node.text)
+                        elif node.tag == f"{_W}tab":
+                            texts.append("\t")
+                        elif node.tag == f"{_W}pStyle":
+                            style = node.get(f"{_W}val", "")
+                    element.clear()
+                    text = "".join(texts).strip()
+                    if not text:
+                        continue
+                    if style and style.lower().startswith(("heading", "title")):
+                        text = f"# {text}"
+                    paragraphs.append(text)
+                    if len(paragraphs) >= DOCX_PARAGRAPHS_PER_BATCH:
+                        number += 1
+                        batch += 1
+                        yield ExtractedPage(number, "\n\n".join(paragraphs) + "\n\n", f"{part} #{batch}")
+                        paragraphs = []
+                if paragraphs:
+                    number += 1
+                    batch += 1
+                    yield ExtractedPage(number, "\n\n".join(paragraphs) + "\n\n", f"{part} #{batch}")
+
+def _xlsx_cell(value: Any) -> str:
+    return "" if value is None else " ".join(str(value).split())
+
+def _xlsx_row(header: List[str], cells: List[str]) -> str:
+    """
+    Render a data row as one keyed sentence, e.g. "Code: 1 | Drug: Aspirin.".
+    Bare tab-separated rows look like numbered headings to the chunker and
+    carry no column names for retrieval.
+    """
+    fields = []
+    for i, cell in enumerate(cells):
+        if cell:
+            name = header[i] if i < len(header) and header[i] else f"Column {i + 1}"
+            fields.append(f"{name}: {cell}")
+    row = " | ".join(fields)
+    return row if row.endswith((".", "!", "?", "؟")) else row + "."
+
+def extract_xlsx(path: str) -> Iterator[ExtractedPage]:
+    """Yield XLSX text sheet by sheet in row batches using read-only mode"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    number = 0
+    try:
+        for sheet in workbook.worksheets:
+            rows: List[str] = [f"# {sheet.title}"]
+            header: Optional[List[str]] = None  # first non-empty row names the columns
+            first_row = 1
+            row_number = 0
+            for row_number, values in enumerate(sheet.iter_rows(values_only=True), start=1):
+                cells = [_xlsx_cell(value) for value in values]
+                if any(cells):
+                    if header is None:
+                        header = cells
+                        rows.append(" | ".join(cell for cell in cells if cell) + ".")
+                    else:
+                        rows.append(_xlsx_row(header, cells))
+                if row_number - first_row + 1 >= XLSX_ROWS_PER_BATCH:
+                    number += 1
+                    yield ExtractedPage(number, "\n".join(rows) + "\n\n", f"{sheet.title} rows {first_row}-{row_number}")
+                    rows = []
+                    first_row = row_number + 1
+            if len(rows) > (1 if first_row == 1 else 0):
+                number += 1
+                yield ExtractedPage(number, "\n".join(rows) + "\n\n", f"{sheet.title} rows {first_row}-{row_number}")
+    finally:
+        workbook.close()
+
+def extract_txt(path: str) -> Iterator[ExtractedPage]:
+    """Yield plain text in fixed-size blocks"""
+    with open(path, encoding="utf-8", errors="replace") as handle:
+        number = 0
+        while True:
+            block = handle.read(TEXT_BLOCK_CHARS)
+            if not block:
+                break
+            number += 1
+            yield ExtractedPage(number, block, f"block {number}")
+
+def _flatten_json(value: Any, path: str) -> Iterator[str]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten_json(item, f"{path}.{key}" if path else str(key))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            yield from _flatten_json(item, f"{path}[{i}]")
+    elif value is not None:
+        yield f"{path}: {value}" if path else str(value)
+
+def extract_json(path: str) -> Iterator[ExtractedPage]:
+    """
+    Yield JSON documents as `path: value` lines in batches. Unlike the other
+    formats the document is parsed whole first; uploads are capped at 10 MB
+    """
+    with open(path, encoding="utf-8") as handle:
+        data = json.load(handle)
+    lines: List[str] = []
+    number = 0
+    for line in _flatten_json(data, ""):
+        lines.append(line)
+        if len(lines) >= JSON_LINES_PER_BATCH:
+            number += 1
+            yield ExtractedPage(number, "\n".join(lines) + "\n\n", f"entries {number}")
+            lines = []
+    if lines:
+        number += 1
+        yield ExtractedPage(number, "\n".join(lines) + "\n\n", f"entries {number}")
+
+EXTRACTORS: Dict[str, Callable[[str], Iterator[ExtractedPage]]] = {
+    "pdf": extract_pdf,
+    "docx": extract_docx,
+    "xlsx": extract_xlsx,
+    "txt": extract_txt,
+    "json": extract_json,
+}
+
+def extract(path: str, document_type: str) -> Iterator[ExtractedPage]:
+    """Extract a document in-process; prefer `extract_in_worker` for uploads"""
+    extractor = EXTRACTORS.get(document_type)
+    if extractor is None:
+        raise ExtractionError(f"Unsupported document type: {document_type}")
+    return extractor(path)
+
+# ============================================================================
+# RESOURCE-LIMITED WORKER
+# ============================================================================
+
+_DONE = "__done__"
+_ERROR = "__error__"
+
+def _worker(path: str, document_type: str, out: "multiprocessing.Queue", cpu_seconds: int, memory_mb: int):
+    """Worker entry point: apply rlimits, then stream pages back to the parent"""
+    try:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        if memory_mb:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass  # Limits are best-effort on platforms without setrlimit
+
+    try:
+        for page in extract(path, document_type):
+            out.put((page.number, page.text, page.label))
+        out.put((_DONE, None, None))
+    except MemoryError:
+        out.put((_ERROR, "Extraction exceeded memory limit", None))
+    except Exception as e:
+        out.put((_ERROR, f"{type(e).__name__}: {e}", None))
+
+def _worker_context():
+    """
+    Prefer a forkserver that has already imported this module: each document
+    then costs a cheap fork instead of a fresh interpreter (spawn), without
+    forking the threaded server process itself.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+def extract_in_worker(
+    path: str,
+    document_type: str,
+    cpu_seconds: int = EXTRACTION_CPU_SECONDS,
+    timeout: float = EXTRACTION_TIMEOUT_SECONDS,
+    memory_mb: int = EXTRACTION_MAX_MEMORY_MB,
+    prefetch: int = 8,
+) -> Iterator[ExtractedPage]:
+    """
+    Extract a document in a separate process with CPU, wall-clock and memory
+    limits. Pages are streamed through a bounded queue, so a slow consumer
+    applies back-pressure instead of the worker buffering the whole document.
+    """
+    if document_type not in EXTRACTORS:
+        raise ExtractionError(f"Unsupported document type: {document_type}")
+
+    context = _worker_context()
+    out = context.Queue(maxsize=prefetch)
+    process = context.Process(
+        target=_worker,
+        args=(path, document_type, out, cpu_seconds, memory_mb),
+        daemon=True,
+    )
+    process.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"Extraction of {path} timed out after {timeout:.0f}s")
+                raise ExtractionError(f"Extraction timed out after {timeout:.0f}s")
+            try:
+                number, text, label = out.get(timeout=min(remaining, 0.5))
+            except queue.Empty:
+                if not process.is_alive() and out.empty():
+                    if process.exitcode in (-signal.SIGXCPU, -signal.SIGKILL):
+                        raise ExtractionError(f"Extraction exceeded CPU limit of {cpu_seconds}s")
+                    raise ExtractionError(f"Extraction worker exited with code {process.exitcode}")
+                continue
+            if number == _DONE:
+                return
+            if number == _ERROR:
+                logger.warning(f"Extraction of {path} failed: {text}")
+                raise ExtractionError(text)
+            yield ExtractedPage(number=number, text=text, label=label)
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join(timeout=1)
+        out.close()
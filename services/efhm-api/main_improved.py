@@ -4,10 +4,11 @@ FastAPI service with Gemini File Search integration
 IMPROVED VERSION with Security Enhancements
 """
 
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request, status
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Request, Response, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field, validator, constr
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field, ValidationError, validator, constr
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -18,6 +19,20 @@ import jwt
 import html
 from functools import wraps
 import json
+import re
+import asyncio
+import tempfile
+from starlette.concurrency import run_in_threadpool
+
+from chunking import chunk_stream, estimate_tokens
+from extraction import CONTENT_TYPES, ExtractionError, extract_in_worker
+from profiling import PROFILING_ENABLED, ProfileStore, ProfilingMiddleware
+from retrieval import RETRIEVAL_TOP_K, get_workspace_index, workspace_indexes
+from scheduler import AdmissionController, QueueFullError
+from sessions import SessionStore, create_summarizer
+from snapshot import SNAPSHOT_DIR, export_workspaces, load_snapshot_dir
+from timing import StageTimer, create_exporter, get_stage_timer, timing_record
+from vectors import VECTOR_DTYPE, WORKSPACE_ID_PATTERN
 
 # Configure logging with audit support
 logging.basicConfig(
@@ -45,12 +60,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["Server-Timing"],
     max_age=600,
 )
 
+# Opt-in per-request profiling - only installed when configured
+profile_store = ProfileStore()
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, store=profile_store)
+
 # Security
 security = HTTPBearer()
 
+# Per-stage latency export (JSON-lines by default)
+timing_exporter = create_exporter()
+
+# Server-side chat sessions for the WebSocket channel
+session_store = SessionStore()
+session_summarizer = create_summarizer()
+background_tasks = set()
+
+# Weighted fair admission control in front of generation
+admission = AdmissionController()
+
 # Configure Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_API_KEY:
@@ -87,6 +119,11 @@ class ComplianceLevel(str, Enum):
     PDPL = "pdpl"
     PHI = "phi"
 
+class VectorStorage(str, Enum):
+    FLOAT32 = "float32"
+    FLOAT16 = "float16"
+    INT8 = "int8"
+
 class DocumentMetadata(BaseModel):
     filename: constr(min_length=1, max_length=255, strip_whitespace=True)
     document_type: DocumentType
@@ -102,11 +139,12 @@ class DocumentMetadata(BaseModel):
 
 class ChatQuery(BaseModel):
     query: constr(min_length=1, max_length=4000, strip_whitespace=True)
-    workspace_id: constr(regex=r'^ws_[a-zA-Z0-9_-]+$')
+    workspace_id: constr(pattern=WORKSPACE_ID_PATTERN)
     language: LanguageCode = LanguageCode.AR
     cultural_context: CulturalContext = CulturalContext.SAUDI
     use_rag: bool = True
     include_citations: bool = True
+    include_timings: bool = False
 
     @validator('query')
     def sanitize_query(cls, v):
@@ -120,12 +158,14 @@ class ChatResponse(BaseModel):
     language: LanguageCode
     model_used: str
     timestamp: str
+    timings: Optional[Dict[str, float]] = None
 
 class WorkspaceCreate(BaseModel):
     name: constr(min_length=1, max_length=100, strip_whitespace=True)
     description: Optional[str] = None
     language: LanguageCode = LanguageCode.AR
     cultural_context: CulturalContext = CulturalContext.SAUDI
+    vector_storage: VectorStorage = VectorStorage(VECTOR_DTYPE)
 
     @validator('name', 'description')
     def sanitize_strings(cls, v):
@@ -194,6 +234,7 @@ def check_rate_limit(identifier: str) -> bool:
 # ============================================================================
 
 async def verify_token(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> Dict[str, Any]:
     """
@@ -205,7 +246,8 @@ async def verify_token(
     try:
         # For demo purposes - use simple JWT
         # In production, use Firebase Admin SDK or Auth0
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        with get_stage_timer(request).span("auth"):
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -231,15 +273,92 @@ async def get_current_user(
         "role": token_payload.get("role", "user")
     }
 
-async def check_user_rate_limit(user: Dict = Depends(get_current_user)):
+async def check_user_rate_limit(
+    request: Request,
+    user: Dict = Depends(get_current_user)
+):
     """Check rate limit for user"""
-    if not check_rate_limit(user["user_id"]):
+    with get_stage_timer(request).span("rate_limit"):
+        allowed = check_rate_limit(user["user_id"])
+    if not allowed:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Rate limit exceeded. Please try again later."
         )
     return user
 
+async def require_admin(user: Dict = Depends(get_current_user)):
+    """Restrict an endpoint to admin users"""
+    if user["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin role required"
+        )
+    return user
+
+# ============================================================================
+# DOCUMENT INGESTION
+# ============================================================================
+
+def ingest_document(contents: bytes, document_type: str, index, document_id: str, timer: StageTimer):
+    """
+    Extract, chunk and index an uploaded document; blocking, run in a threadpool.
+    Chunks are indexed in batches as pages arrive, so the document's chunks are
+    never held in memory all at once. Chunks indexed before an extraction
+    failure stay in the index.
+    """
+    with tempfile.NamedTemporaryFile(suffix=f".{document_type}") as handle:
+        handle.write(contents)
+        handle.flush()
+        pages = 0
+        chunks = 0
+        extract_seconds = 0.0
+
+        def segments():
+            nonlocal pages
+            for page in extract_in_worker(handle.name, document_type):
+                pages += 1
+                yield page.text
+
+        def timed_chunks(stream):
+            # Time spent producing chunks is extraction; the rest is indexing
+            nonlocal chunks, extract_seconds
+            while True:
+                started = time()
+                chunk = next(stream, None)
+                extract_seconds += time() - started
+                if chunk is None:
+                    return
+                chunks += 1
+                yield chunk
+
+        started = time()
+        try:
+            index.add_document(document_id, timed_chunks(chunk_stream(segments())))
+        finally:
+            timer.add("extract_chunk", extract_seconds * 1000)
+            timer.add("index", (time() - started - extract_seconds) * 1000)
+    return chunks, pages
+
+def build_prompt(query: ChatQuery, hits) -> str:
+    """Build the generation prompt, grounding it in retrieved chunks when available"""
+    context = ""
+    if hits:
+        sources = "\n\n".join(f"[{i}] {hit.chunk.text}" for i, hit in enumerate(hits, start=1))
+        context = f"""
+Answer using the numbered sources below and cite them as [n].
+
+Sources:
+{sources}
+"""
+    return f"""You are a helpful assistant for BrainSAIT healthcare platform.
+Cultural context: {query.cultural_context}
+Language: {query.language}
+{context}
+User query: {query.query}
+
+Provide a helpful, accurate response in {query.language} language."""
+
 # ============================================================================
 # ROUTES WITH ENHANCED SECURITY
 # ============================================================================
@@ -292,6 +411,10 @@ async def create_workspace(
         request=request
     )
     
+    # Compact (float16/int8) workspaces search quantized vectors and rescore
+    # the top candidates from full-precision vectors kept on disk
+    get_workspace_index(workspace_id, vector_dtype=workspace.vector_storage.value)
+    
     # TODO: Save to database
     
     return {
@@ -300,6 +423,7 @@ async def create_workspace(
         "description": workspace.description,
         "language": workspace.language,
         "cultural_context": workspace.cultural_context,
+        "vector_storage": workspace.vector_storage,
         "created_at": datetime.utcnow().isoformat(),
         "user_id": user["user_id"]
     }
@@ -318,17 +442,20 @@ async def list_workspaces(
 
 @app.post("/documents/upload")
 async def upload_document(
+    response: Response,
     file: UploadFile = File(...),
-    workspace_id: str = Field(...),
-    metadata: str = Field(...),  # JSON string
+    workspace_id: str = Form(..., pattern=WORKSPACE_ID_PATTERN),
+    metadata: str = Form(...),  # JSON string
+    include_timings: bool = False,
     request: Request = None,
     user: Dict = Depends(check_user_rate_limit)
 ):
     """Upload and index a document for RAG"""
+    timer = get_stage_timer(request)
     
     # Validate file type
-    allowed_types = ["application/pdf", "text/plain", "application/json"]
-    if file.content_type not in allowed_types:
+    document_type = CONTENT_TYPES.get(file.content_type)
+    if document_type is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File type {file.content_type} not allowed"
@@ -336,7 +463,8 @@ async def upload_document(
     
     # Validate file size (10MB max)
     max_size = 10 * 1024 * 1024
-    contents = await file.read()
+    with timer.span("read"):
+        contents = await file.read()
     if len(contents) > max_size:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
@@ -346,33 +474,60 @@ async def upload_document(
     logger.info(f"Uploading document {file.filename} to workspace {workspace_id}")
     
     # Audit log
-    await audit_log(
-        user_id=user["user_id"],
-        action="document.upload",
-        resource=workspace_id,
-        details={"filename": file.filename, "size": len(contents)},
-        request=request
-    )
+    with timer.span("audit"):
+        await audit_log(
+            user_id=user["user_id"],
+            action="document.upload",
+            resource=workspace_id,
+            details={"filename": file.filename, "size": len(contents)},
+            request=request
+        )
+    
+    document_id = f"doc_{int(datetime.utcnow().timestamp() * 1000)}"
+    
+    # Extract text in a resource-limited worker, chunk and index it as pages arrive
+    index = get_workspace_index(workspace_id)
+    try:
+        chunks, pages = await run_in_threadpool(ingest_document, contents, document_type, index, document_id, timer)
+    except ExtractionError as e:
+        logger.error(f"Extraction failed for {file.filename}: {str(e)}")
+        timer.finish()
+        timing_exporter.export(timing_record("documents.upload", timer, success=False))
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Could not extract text: {str(e)}",
+            headers={"Server-Timing": timer.server_timing()}
+        )
     
-    # TODO: Implement document upload and indexing
+    # TODO: Persist documents and indexes
     # 1. Save file to storage (GCS/S3)
-    # 2. Extract text content
-    # 3. Chunk document
-    # 4. Index with Gemini File Search or vector DB
-    # 5. Store metadata in database
+    # 2. Store metadata and chunks in database
     
-    return {
-        "document_id": f"doc_{int(datetime.utcnow().timestamp() * 1000)}",
+    timings = timer.finish()
+    response.headers["Server-Timing"] = timer.server_timing()
+    timing_exporter.export(timing_record(
+        "documents.upload", timer, document_type=document_type, pages=pages, chunks=chunks
+    ))
+    
+    result = {
+        "document_id": document_id,
         "filename": file.filename,
         "workspace_id": workspace_id,
+        "document_type": document_type,
+        "pages": pages,
+        "chunks": chunks,
         "status": "indexed",
         "uploaded_at": datetime.utcnow().isoformat()
     }
+    if include_timings:
+        result["timings"] = timings
+    return result
 
 @app.post("/chat/query", response_model=ChatResponse)
 async def chat_query(
     query: ChatQuery,
     request: Request,
+    response: Response,
     user: Dict = Depends(check_user_rate_limit)
 ):
     """Query documents using RAG with rate limiting"""
@@ -382,46 +537,75 @@ async def chat_query(
             detail="Gemini API not configured"
         )
     
+    timer = get_stage_timer(request)
+    
     try:
         logger.info(f"Processing query for workspace {query.workspace_id}")
         
         # Audit log
-        await audit_log(
-            user_id=user["user_id"],
-            action="chat.query",
-            resource=query.workspace_id,
-            details={"language": query.language},
-            request=request
-        )
+        with timer.span("audit"):
+            await audit_log(
+                user_id=user["user_id"],
+                action="chat.query",
+                resource=query.workspace_id,
+                details={"language": query.language},
+                request=request
+            )
         
-        # TODO: Implement actual RAG pipeline
-        # 1. Retrieve relevant documents from workspace
-        # 2. Use Gemini File Search or vector search
-        # 3. Generate response with citations
+        # Retrieve relevant chunks from the workspace
+        hits = []
+        if query.use_rag:
+            with timer.span("retrieval"):
+                index = get_workspace_index(query.workspace_id, create=False)
+                if index is not None and len(index):
+                    hits = await run_in_threadpool(index.search, query.query, top_k=RETRIEVAL_TOP_K)
         
-        # Placeholder response using Gemini
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        prompt = f"""You are a helpful assistant for BrainSAIT healthcare platform.
-Cultural context: {query.cultural_context}
-Language: {query.language}
-
-User query: {query.query}
-
-Provide a helpful, accurate response in {query.language} language."""
-
-        response = model.generate_content(prompt)
+        with timer.span("prompt"):
+            model = genai.GenerativeModel('gemini-2.0-flash-exp')
+            prompt = build_prompt(query, hits)
+
+        # Wait for a fair-share generation slot; fails fast when the queue is full
+        async with admission.slot(user["user_id"], query.workspace_id, user["role"]) as ticket:
+            timer.add("queue", ticket.wait_ms)
+            with timer.span("generation"):
+                generated = await model.generate_content_async(prompt)
+        
+        timings = timer.finish()
+        response.headers["Server-Timing"] = timer.server_timing()
+        timing_exporter.export(timing_record("chat.query", timer, language=query.language))
         
         return ChatResponse(
-            answer=response.text,
-            citations=[],
+            answer=generated.text,
+            citations=[hit.citation() for hit in hits] if query.include_citations else [],
             confidence=0.85,
             language=query.language,
             model_used="gemini-2.0-flash-exp",
-            timestamp=datetime.utcnow().isoformat()
+            timestamp=datetime.utcnow().isoformat(),
+            timings=timings if query.include_timings else None
+        )
+    
+    except QueueFullError as e:
+        logger.warning(f"Rejected query from {user['user_id']}: {e.detail}")
+        timer.finish()
+        timing_exporter.export(timing_record("chat.query", timer, success=False, rejected=True))
+        await audit_log(
+            user_id=user["user_id"],
+            action="chat.query",
+            resource=query.workspace_id,
+            details={"error": e.detail},
+            request=request,
+            success=False
+        )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after), "Server-Timing": timer.server_timing()}
         )
     
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
+        timer.finish()
+        timing_exporter.export(timing_record("chat.query", timer, success=False))
         
         # Audit failed attempt
         await audit_log(
@@ -435,9 +619,163 @@ Provide a helpful, accurate response in {query.language} language."""
         
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Query processing failed: {str(e)}"
+            detail=f"Query processing failed: {str(e)}",
+            headers={"Server-Timing": timer.server_timing()}
         )
 
+# Browsers cannot set headers on WebSockets; the bearer token travels as the
+# second subprotocol instead of in the URL, where access logs would record it
+WS_AUTH_SUBPROTOCOL = "efhm.bearer"
+
+def websocket_bearer_token(websocket: WebSocket) -> str:
+    """Token from `Sec-WebSocket-Protocol: efhm.bearer, <jwt>`"""
+    protocols = [p.strip() for p in websocket.headers.get("sec-websocket-protocol", "").split(",")]
+    if len(protocols) == 2 and protocols[0] == WS_AUTH_SUBPROTOCOL:
+        return protocols[1]
+    return ""
+
+@app.websocket("/chat/ws")
+async def chat_session(websocket: WebSocket):
+    """
+    Session-based chat over WebSocket.
+    Connect to ?workspace_id=<ws_id> (or ?session_id=<id> to resume) with
+    subprotocols ["efhm.bearer", <jwt>], then send {"query": ...} messages.
+    History stays server-side and older turns are compacted into a summary to
+    keep prompts within budget.
+    """
+    try:
+        payload = jwt.decode(websocket_bearer_token(websocket), JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    user_id = payload.get("sub", "user_unknown")
+    role = payload.get("role", "user")
+    
+    session_id = websocket.query_params.get("session_id")
+    session = session_store.get(session_id, user_id) if session_id else None
+    if session is None:
+        workspace_id = websocket.query_params.get("workspace_id", "")
+        if not re.fullmatch(WORKSPACE_ID_PATTERN, workspace_id):
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        session = session_store.create(user_id, workspace_id)
+    
+    await websocket.accept(subprotocol=WS_AUTH_SUBPROTOCOL)
+    await websocket.send_json({"type": "session", "session_id": session.session_id, "turns": session.turn_count})
+    await audit_log(
+        user_id=user_id,
+        action="chat.session",
+        resource=session.workspace_id,
+        details={"session_id": session.session_id},
+        request=websocket
+    )
+    
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except (ValueError, KeyError):
+                # Non-JSON text or a binary frame; the session stays open
+                await websocket.send_json({"type": "error", "detail": "Messages must be JSON objects"})
+                continue
+            timer = StageTimer()
+            
+            with timer.span("rate_limit"):
+                allowed = check_rate_limit(user_id)
+            if not allowed:
+                await websocket.send_json({"type": "error", "detail": "Rate limit exceeded. Please try again later."})
+                continue
+            try:
+                query = ChatQuery(**{**message, "workspace_id": session.workspace_id})
+            except (ValidationError, TypeError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            
+            with timer.span("audit"):
+                await audit_log(
+                    user_id=user_id,
+                    action="chat.query",
+                    resource=session.workspace_id,
+                    details={"language": query.language, "session_id": session.session_id},
+                    request=websocket
+                )
+            
+            # Reuse the previous turn's sources while they still cover the question;
+            # a turn with use_rag off neither retrieves nor sees cached sources
+            context_reused = query.use_rag and session.context_covers(query.query)
+            if query.use_rag and not context_reused:
+                with timer.span("retrieval"):
+                    index = get_workspace_index(session.workspace_id, create=False)
+                    if index is not None and len(index):
+                        session.set_context(await run_in_threadpool(index.search, query.query, top_k=RETRIEVAL_TOP_K))
+            
+            with timer.span("prompt"):
+                prompt = session.build_prompt(query.query, query.language, query.cultural_context,
+                                              use_sources=query.use_rag)
+            
+            try:
+                async with admission.slot(user_id, session.workspace_id, role) as ticket:
+                    timer.add("queue", ticket.wait_ms)
+                    with timer.span("generation"):
+                        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+                        generated = await model.generate_content_async(prompt)
+                answer = generated.text
+            except QueueFullError as e:
+                timing_exporter.export(timing_record("chat.ws", timer, success=False, rejected=True))
+                await audit_log(
+                    user_id=user_id,
+                    action="chat.query",
+                    resource=session.workspace_id,
+                    details={"session_id": session.session_id, "error": e.detail},
+                    request=websocket,
+                    success=False
+                )
+                await websocket.send_json({"type": "error", "detail": e.detail, "retry_after": e.retry_after})
+                continue
+            except Exception as e:
+                logger.error(f"Error processing session query: {str(e)}")
+                timing_exporter.export(timing_record("chat.ws", timer, success=False))
+                await audit_log(
+                    user_id=user_id,
+                    action="chat.query",
+                    resource=session.workspace_id,
+                    details={"session_id": session.session_id, "error": str(e)},
+                    request=websocket,
+                    success=False
+                )
+                await websocket.send_json({"type": "error", "detail": "Query processing failed"})
+                continue
+            
+            # Only answered turns enter history, so failed questions are not replayed
+            session.add_turn("user", query.query)
+            session.add_turn("assistant", answer)
+            timings = timer.finish()
+            timing_exporter.export(timing_record("chat.ws", timer, context_reused=context_reused))
+            await websocket.send_json({
+                "type": "answer",
+                "session_id": session.session_id,
+                "turn": session.turn_count,
+                "answer": answer,
+                "citations": [hit.citation() for hit in session.context_hits]
+                             if query.use_rag and query.include_citations else [],
+                "context_reused": context_reused,
+                "prompt_tokens": estimate_tokens(prompt),
+                "history_tokens": session.history_tokens,
+                "language": query.language,
+                "model_used": "gemini-2.0-flash-exp",
+                "timestamp": datetime.utcnow().isoformat(),
+                "timings": timings if query.include_timings else None
+            })
+            
+            # Compact after replying so summarization stays off the turn's critical path
+            if session.needs_compaction():
+                task = asyncio.create_task(session.compact(session_summarizer))
+                background_tasks.add(task)
+                task.add_done_callback(background_tasks.discard)
+    
+    except WebSocketDisconnect:
+        logger.info(f"Session {session.session_id} disconnected")
+
 @app.get("/documents")
 async def list_documents(
     workspace_id: str,
@@ -472,6 +810,79 @@ async def delete_document(
     # TODO: Implement document deletion
     return {"status": "deleted", "document_id": document_id}
 
+# ============================================================================
+# ADMIN: REQUEST PROFILES
+# ============================================================================
+
+@app.get("/admin/profiles")
+async def list_profiles(
+    limit: int = 100,
+    user: Dict = Depends(require_admin)
+):
+    """List stored request profiles, newest first"""
+    profiles = profile_store.list(limit=limit)
+    return {"profiles": profiles, "total": len(profiles), "enabled": PROFILING_ENABLED}
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    request: Request,
+    user: Dict = Depends(require_admin)
+):
+    """Download a profile as folded stacks (flamegraph.pl, speedscope, inferno)"""
+    path = profile_store.path(profile_id)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    
+    await audit_log(
+        user_id=user["user_id"],
+        action="profile.download",
+        resource=profile_id,
+        details={},
+        request=request
+    )
+    
+    return FileResponse(path, media_type="text/plain", filename=path.name)
+
+# ============================================================================
+# ADMIN: ADMISSION CONTROL
+# ============================================================================
+
+@app.get("/admin/admission")
+async def admission_stats(
+    user: Dict = Depends(require_admin)
+):
+    """Generation queue depth, admissions, rejections and queue wait percentiles"""
+    return admission.stats()
+
+# ============================================================================
+# ADMIN: WORKSPACE SNAPSHOTS
+# ============================================================================
+
+@app.post("/admin/snapshots")
+async def export_snapshots(
+    request: Request,
+    user: Dict = Depends(require_admin)
+):
+    """Write a binary snapshot of every workspace index to SNAPSHOT_DIR"""
+    if not SNAPSHOT_DIR:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="SNAPSHOT_DIR is not configured"
+        )
+    written = await run_in_threadpool(export_workspaces, dict(workspace_indexes), SNAPSHOT_DIR)
+    await audit_log(
+        user_id=user["user_id"],
+        action="snapshot.export",
+        resource=SNAPSHOT_DIR,
+        details={"workspaces": len(written)},
+        request=request
+    )
+    return {"directory": SNAPSHOT_DIR, "workspaces": written, "total": len(written)}
+
 # ============================================================================
 # DEMO: Generate JWT Token (Remove in production)
 # ============================================================================
@@ -502,6 +913,9 @@ async def startup_event():
     logger.info("Starting EFHM API (Improved Version)...")
     logger.info(f"Gemini API configured: {GEMINI_API_KEY is not None}")
     logger.info(f"Allowed CORS origins: {ALLOWED_ORIGINS}")
+    # Map workspace snapshots so the node serves queries without re-indexing
+    if SNAPSHOT_DIR and os.path.isdir(SNAPSHOT_DIR):
+        workspace_indexes.update(load_snapshot_dir(SNAPSHOT_DIR))
     # TODO: Initialize database connections
     # TODO: Initialize Redis connection
     # TODO: Verify Gemini API access
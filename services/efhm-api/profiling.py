@@ -0,0 +1,242 @@
+"""
+EFHM Request Profiling
+Opt-in sampling profiler for single requests, stored as folded flame-graph stacks
+"""
+
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+
+logger = logging.getLogger("efhm.profiling")
+
+# Profiling is off unless a header token or a sampling rate is configured
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/efhm-profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+PROFILE_MAX_COUNT = int(os.getenv("PROFILE_MAX_COUNT", "200"))
+PROFILE_MAX_AGE_HOURS = float(os.getenv("PROFILE_MAX_AGE_HOURS", "24"))
+PROFILE_PATHS = set(os.getenv("PROFILE_PATHS", "/chat/query,/documents/upload").split(","))
+PROFILE_HEADER = b"x-efhm-profile"
+
+PROFILING_ENABLED = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+_PROFILE_ID = re.compile(r"^prof_[0-9a-f_]+$")
+
+# ============================================================================
+# SAMPLER
+# ============================================================================
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+def _await_stack(coro: Any) -> List[str]:
+    """Logical stack of a suspended task, following the coroutine await chain"""
+    stack = []
+    current = coro
+    while current is not None:
+        frame = getattr(current, "cr_frame", None) or getattr(current, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_label(frame.f_code))
+        current = getattr(current, "cr_await", None) or getattr(current, "gi_yieldfrom", None)
+    awaited = type(current).__name__ if current is not None else "Future"
+    stack.append(f"[await {awaited}]")
+    return stack
+
+class RequestProfiler:
+    """
+    Samples one asyncio task from a background thread. While the task runs,
+    the event loop thread's real stack is recorded; while it is suspended,
+    its await chain is recorded instead, so time spent waiting on I/O,
+    threadpools or upstream APIs shows up as `[await ...]` frames.
+    """
+
+    def __init__(self, task: "asyncio.Task", interval: float):
+        self.task = task
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="efhm-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self._sample()
+            except Exception:  # Never let the sampler break the request
+                pass
+
+    def _sample(self):
+        coro = self.task.get_coro()
+        root = getattr(coro, "cr_frame", None)
+        if getattr(coro, "cr_running", False):
+            frames = []
+            frame = sys._current_frames().get(self.thread_id)
+            while frame is not None:
+                frames.append(frame)
+                if frame is root:
+                    break
+                frame = frame.f_back
+            stack = [_label(f.f_code) for f in reversed(frames)]
+        else:
+            stack = _await_stack(coro)
+        self.samples[";".join(stack)] += 1
+
+# ============================================================================
+# STORAGE
+# ============================================================================
+
+class ProfileStore:
+    """
+    Stores profiles as `<id>.folded` stacks plus `<id>.json` metadata.
+    Each save prunes profiles beyond `max_count` or older than `max_age_hours`
+    (0 disables either limit).
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, max_count: int = PROFILE_MAX_COUNT,
+                 max_age_hours: float = PROFILE_MAX_AGE_HOURS):
+        self.directory = Path(directory)
+        self.max_count = max_count
+        self.max_age_hours = max_age_hours
+
+    def save(self, profile_id: str, samples: Counter, meta: Dict[str, Any]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        folded = "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+        (self.directory / f"{profile_id}.folded").write_text(folded, encoding="utf-8")
+        (self.directory / f"{profile_id}.json").write_text(json.dumps(meta), encoding="utf-8")
+        self.prune()
+
+    def _profiles(self) -> List[Tuple[float, Path]]:
+        """(mtime, metadata path) of stored profiles, newest first"""
+        profiles = []
+        for meta in self.directory.glob("prof_*.json"):
+            try:
+                profiles.append((meta.stat().st_mtime, meta))
+            except FileNotFoundError:
+                continue  # pruned by a concurrent save
+        profiles.sort(reverse=True)
+        return profiles
+
+    def prune(self) -> int:
+        """Delete the oldest profiles beyond the count and age limits; returns how many were removed"""
+        profiles = self._profiles()
+        expired = profiles[self.max_count:] if self.max_count > 0 else []
+        if self.max_age_hours > 0:
+            cutoff = time.time() - self.max_age_hours * 3600
+            expired += [p for p in profiles[:len(profiles) - len(expired)] if p[0] < cutoff]
+        for _, meta in expired:
+            meta.with_suffix(".folded").unlink(missing_ok=True)
+            meta.unlink(missing_ok=True)
+        return len(expired)
+
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for _, meta in self._profiles()[:limit]:
+            try:
+                profiles.append(json.loads(meta.read_text(encoding="utf-8")))
+            except FileNotFoundError:
+                continue  # pruned by a concurrent save
+        return profiles
+
+    def path(self, profile_id: str) -> Optional[Path]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.folded"
+        return path if path.exists() else None
+
+# ============================================================================
+# MIDDLEWARE
+# ============================================================================
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware that profiles a request when it carries the
+    privileged `X-EFHM-Profile` header or is picked by the sampling rate.
+    Untriggered requests only pay a path lookup; only install the middleware
+    when `PROFILING_ENABLED` so that disabled deployments pay nothing.
+    """
+
+    def __init__(self, app, store: ProfileStore, token: str = PROFILE_TOKEN,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, paths=PROFILE_PATHS):
+        self.app = app
+        self.store = store
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+        self.paths = paths
+        self.active = 0
+
+    def _triggered(self, scope) -> Optional[str]:
+        if self.token:
+            for name, value in scope.get("headers", ()):
+                if name == PROFILE_HEADER and hmac.compare_digest(value, self.token):
+                    return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        trigger = self._triggered(scope)
+        if trigger is None or self.active >= PROFILE_MAX_CONCURRENT:
+            return await self.app(scope, receive, send)
+
+        profile_id = f"prof_{int(time.time() * 1000)}_{secrets.token_hex(4)}"
+        status_code = 500
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", []).append((b"x-efhm-profile-id", profile_id.encode()))
+            await send(message)
+
+        self.active += 1
+        profiler = RequestProfiler(asyncio.current_task(), PROFILE_INTERVAL_MS / 1000)
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            samples = profiler.stop()
+            self.active -= 1
+            meta = {
+                "profile_id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "trigger": trigger,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "interval_ms": PROFILE_INTERVAL_MS,
+                "samples": sum(samples.values()),
+                "created_at": datetime.utcnow().isoformat(),
+            }
+            try:
+                await asyncio.to_thread(self.store.save, profile_id, samples, meta)
+                logger.info(f"Stored profile {profile_id} for {scope['method']} {scope['path']}")
+            except OSError as e:
+                logger.error(f"Failed to store profile {profile_id}: {str(e)}")
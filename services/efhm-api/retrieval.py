@@ -0,0 +1,291 @@
+"""
+EFHM Retrieval
+Per-workspace chunk index with BM25 lexical search, dense vectors and hybrid fusion
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+import hashlib
+import itertools
+import logging
+import math
+import os
+import re
+import threading
+
+import numpy as np
+
+from chunking import Chunk
+from vectors import VECTOR_DTYPE, VectorStore, workspace_rescore_path
+
+logger = logging.getLogger("efhm.retrieval")
+
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "lexical")
+RETRIEVAL_EMBEDDER = os.getenv("RETRIEVAL_EMBEDDER", "hashing")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+
+SEARCH_MODES = ("lexical", "dense", "hybrid")
+
+# ============================================================================
+# NORMALIZATION
+# ============================================================================
+
+_DIACRITICS = re.compile("[\u064B-\u065F\u0670\u0640]")  # harakat, dagger alef, tatweel
+_ARABIC_FOLD = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ى": "ي", "ة": "ه", "ؤ": "و", "ئ": "ي"})
+_WORD = re.compile(r"\w+")
+_AR_PREFIX = ("وال", "بال", "كال", "فال", "لل", "ال")
+
+def normalize(text: str) -> str:
+    """Lowercase and fold Arabic orthographic variants so queries match documents"""
+    return _DIACRITICS.sub("", text).translate(_ARABIC_FOLD).lower()
+
+def tokenize(text: str) -> List[str]:
+    """Normalized word tokens with the Arabic definite article stripped"""
+    tokens = []
+    for word in _WORD.findall(normalize(text)):
+        for prefix in _AR_PREFIX:
+            if word.startswith(prefix) and len(word) - len(prefix) >= 2:
+                word = word[len(prefix):]
+                break
+        if len(word) > 1 or word.isdigit():
+            tokens.append(word)
+    return tokens
+
+# ============================================================================
+# EMBEDDERS
+# ============================================================================
+
+class HashingEmbedder:
+    """
+    Deterministic feature-hashing embedder over words and character trigrams.
+    Needs no model or network, which makes it the default for benchmarks and
+    local development; production deployments can select `gemini`.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text: str):
+        for token in tokenize(text):
+            yield token, 1.0
+            padded = f" {token} "
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                out[row, bucket] += sign * weight
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+class GeminiEmbedder:
+    """Embeds text with the Gemini embedding API"""
+
+    def __init__(self, model: str = "models/text-embedding-004", dim: int = 768):
+        self.model = model
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str], task_type: str = "retrieval_document") -> np.ndarray:
+        import google.generativeai as genai
+
+        result = genai.embed_content(model=self.model, content=list(texts), task_type=task_type)
+        vectors = np.asarray(result["embedding"], dtype=np.float32).reshape(len(texts), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text], task_type="retrieval_query")[0]
+
+def create_embedder(name: str = RETRIEVAL_EMBEDDER):
+    if name == "gemini":
+        return GeminiEmbedder()
+    return HashingEmbedder()
+
+# ============================================================================
+# WORKSPACE INDEX
+# ============================================================================
+
+@dataclass
+class SearchHit:
+    chunk_id: int
+    document_id: str
+    score: float
+    chunk: Chunk
+
+    def citation(self) -> Dict:
+        return {
+            "document_id": self.document_id,
+            "chunk_index": self.chunk.index,
+            "start": self.chunk.start,
+            "end": self.chunk.end,
+            "page_start": self.chunk.page_start,
+            "page_end": self.chunk.page_end,
+            "heading": self.chunk.heading,
+            "score": round(self.score, 4),
+        }
+
+class WorkspaceIndex:
+    """
+    Chunks of one workspace with BM25 postings and a (possibly quantized) vector store.
+
+    Uploads index in a threadpool while queries search, so `lock` guards every
+    read and write of the containers. Embedding and tokenizing happen outside
+    the lock; each batch is then published in one step.
+    """
+
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    RRF_K = 60
+
+    def __init__(self, workspace_id: str, embedder=None, vector_dtype: str = VECTOR_DTYPE,
+                 rescore: bool = True):
+        self.workspace_id = workspace_id
+        self.embedder = embedder or create_embedder()
+        self.lock = threading.Lock()
+        self.chunks: List[Chunk] = []
+        self.document_ids: List[str] = []
+        self.postings: Dict[str, Dict[int, int]] = {}  # term -> {chunk_id: tf}
+        self.lengths: List[int] = []
+        self.total_length = 0
+        self.vectors = VectorStore(
+            self.embedder.dim,
+            dtype=vector_dtype,
+            rescore_path=workspace_rescore_path(workspace_id, vector_dtype) if rescore else None,
+        )
+
+    @classmethod
+    def restore(cls, workspace_id: str, chunks: Sequence[Chunk], document_ids: Sequence[str], postings,
+                lengths: Sequence[int], total_length: int, vectors: VectorStore, embedder=None) -> "WorkspaceIndex":
+        """
+        Wrap existing containers (e.g. snapshot views) without re-indexing.
+        They must support `append` (and `setdefault` for postings) so
+        documents can still be added afterwards.
+        """
+        index = cls.__new__(cls)  # skip __init__, which would truncate the rescore file
+        index.workspace_id = workspace_id
+        index.embedder = embedder or create_embedder()
+        index.lock = threading.Lock()
+        index.chunks = chunks
+        index.document_ids = document_ids
+        index.postings = postings
+        index.lengths = lengths
+        index.total_length = total_length
+        index.vectors = vectors
+        return index
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def add_document(self, document_id: str, chunks: Iterable[Chunk], batch_size: int = 64):
+        """
+        Index a document's chunks batch by batch as they are produced, so a
+        chunk stream is never held whole; blocking, run in a threadpool from
+        async code
+        """
+        chunks = iter(chunks)
+        while True:
+            batch = list(itertools.islice(chunks, batch_size))
+            if not batch:
+                break
+            vectors = self.embedder.embed([c.text for c in batch])
+            counts = []
+            for chunk in batch:
+                tf: Dict[str, int] = {}
+                for term in tokenize(chunk.text):
+                    tf[term] = tf.get(term, 0) + 1
+                counts.append(tf)
+            with self.lock:
+                self.vectors.add(vectors)
+                for chunk, tf in zip(batch, counts):
+                    chunk_id = len(self.chunks)
+                    self.chunks.append(chunk)
+                    self.document_ids.append(document_id)
+                    length = sum(tf.values())
+                    self.lengths.append(length)
+                    self.total_length += length
+                    for term, count in tf.items():
+                        self.postings.setdefault(term, {})[chunk_id] = count
+
+    def _lexical_scores(self, query: str) -> Dict[int, float]:
+        n = len(self.chunks)
+        avg_length = self.total_length / n if n else 0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            entry = self.postings.get(term)
+            if not entry:
+                continue
+            idf = math.log(1 + (n - len(entry) + 0.5) / (len(entry) + 0.5))
+            for chunk_id, tf in entry.items():
+                norm = self.BM25_K1 * (1 - self.BM25_B + self.BM25_B * self.lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def _dense_scores(self, query_vector: np.ndarray, limit: int) -> Dict[int, float]:
+        if not len(self.vectors):
+            return {}
+        ids, scores = self.vectors.search(query_vector, limit)
+        return {int(i): float(score) for i, score in zip(ids, scores)}
+
+    @staticmethod
+    def _top(scores: Dict[int, float], k: int) -> List[int]:
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K, mode: str = RETRIEVAL_MODE) -> List[SearchHit]:
+        """
+        Return the top_k chunks for a query using lexical, dense or hybrid (RRF)
+        ranking; blocking (the embedder may call a remote API), run in a
+        threadpool from async code
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        # Embed before taking the lock so a slow embedder does not stall uploads
+        query_vector = self.embedder.embed_query(query) if mode != "lexical" else None
+        with self.lock:
+            if mode == "lexical":
+                scores = self._lexical_scores(query)
+            elif mode == "dense":
+                scores = self._dense_scores(query_vector, top_k)
+            else:
+                # Reciprocal rank fusion over a deeper candidate pool from each ranker
+                depth = max(top_k * 4, 20)
+                scores = {}
+                for ranked in (self._top(self._lexical_scores(query), depth),
+                               self._top(self._dense_scores(query_vector, depth), depth)):
+                    for rank, chunk_id in enumerate(ranked):
+                        scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (self.RRF_K + rank + 1)
+            return [
+                SearchHit(chunk_id, self.document_ids[chunk_id], scores[chunk_id], self.chunks[chunk_id])
+                for chunk_id in self._top(scores, top_k)
+            ]
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size of chunk text, postings and vectors"""
+        with self.lock:
+            text = sum(len(c.text.encode("utf-8")) for c in self.chunks)
+            postings = sum(len(term) + 16 * len(entry) for term, entry in self.postings.items())
+            return text + postings + self.vectors.nbytes
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+workspace_indexes: Dict[str, WorkspaceIndex] = {}
+
+def get_workspace_index(workspace_id: str, create: bool = True,
+                        vector_dtype: str = VECTOR_DTYPE) -> Optional[WorkspaceIndex]:
+    """Return the in-memory index for a workspace (replace with shared storage in production)"""
+    index = workspace_indexes.get(workspace_id)
+    if index is None and create:
+        index = workspace_indexes[workspace_id] = WorkspaceIndex(workspace_id, vector_dtype=vector_dtype)
+    return index
@@ -0,0 +1,221 @@
+"""
+EFHM Admission Control
+Weighted fair queuing of generation requests per workspace and per user
+"""
+
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict
+import asyncio
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger("efhm.scheduler")
+
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "8"))
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "64"))
+MAX_QUEUED_PER_USER = int(os.getenv("MAX_QUEUED_PER_USER", "8"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("QUEUE_TIMEOUT_SECONDS", "30"))
+
+# Scheduling weight per token role; higher weights get proportionally more slots
+ROLE_WEIGHTS = {
+    "admin": 4.0,
+    "healthcare_professional": 4.0,
+    "user": 2.0,
+    "service": 1.0,
+    "batch": 1.0,
+}
+DEFAULT_ROLE_WEIGHT = 1.0
+
+class QueueFullError(Exception):
+    """Raised when a request cannot be admitted; carries a Retry-After hint"""
+
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+@dataclass
+class Ticket:
+    """Admission result for one request"""
+    wait_ms: float = 0.0
+    queued: bool = False
+
+@dataclass
+class _Waiter:
+    future: "asyncio.Future"
+    cost: float
+    enqueued: float
+
+@dataclass
+class _Flow:
+    """A backlogged user (leaf) or workspace (parent) with its stride-scheduling pass"""
+    key: str
+    weight: float = DEFAULT_ROLE_WEIGHT
+    pass_: float = 0.0
+    waiters: Deque[_Waiter] = field(default_factory=deque)
+    users: Dict[str, "_Flow"] = field(default_factory=dict)
+    vtime: float = 0.0  # virtual time of the user level inside a workspace
+
+    def backlog(self) -> int:
+        if self.users:
+            return sum(len(u.waiters) for u in self.users.values())
+        return len(self.waiters)
+
+class AdmissionController:
+    """
+    Admission control in front of generation.
+
+    Up to `max_concurrent` requests run at once. Excess requests wait in a
+    two-level weighted fair queue: workspaces share slots in proportion to the
+    highest role weight waiting in them, and users within a workspace share
+    its slots by role weight (hierarchical stride scheduling). Queue depth is
+    bounded globally and per user; beyond that requests fail fast with a
+    Retry-After estimate instead of waiting without bound.
+    """
+
+    def __init__(self, max_concurrent: int = GENERATION_CONCURRENCY, max_queue_depth: int = MAX_QUEUE_DEPTH,
+                 max_queued_per_user: int = MAX_QUEUED_PER_USER, queue_timeout: float = QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_queue_depth = max_queue_depth
+        self.max_queued_per_user = max_queued_per_user
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.queued = 0
+        self.workspaces: Dict[str, _Flow] = {}
+        self.vtime = 0.0  # virtual time of the workspace level
+        self.service_ewma = 1.0  # seconds per request, for Retry-After
+        self.admitted = 0
+        self.rejected = 0
+        self._waits: Deque[float] = deque(maxlen=1000)
+
+    # ------------------------------------------------------------------ public
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, workspace_id: str, role: str = "user",
+                   cost: float = 1.0) -> AsyncIterator[Ticket]:
+        """Hold a generation slot for the duration of the block"""
+        ticket = await self.acquire(user_id, workspace_id, role, cost)
+        started = time.monotonic()
+        try:
+            yield ticket
+        finally:
+            elapsed = time.monotonic() - started
+            self.service_ewma = 0.9 * self.service_ewma + 0.1 * elapsed
+            self.release()
+
+    async def acquire(self, user_id: str, workspace_id: str, role: str = "user", cost: float = 1.0) -> Ticket:
+        if self.running < self.max_concurrent and self.queued == 0:
+            self.running += 1
+            self.admitted += 1
+            self._waits.append(0.0)
+            return Ticket()
+
+        workspace = self.workspaces.get(workspace_id)
+        user = workspace.users.get(user_id) if workspace else None
+        if self.queued >= self.max_queue_depth:
+            self._reject(f"Generation queue is full ({self.queued} waiting)")
+        if user is not None and len(user.waiters) >= self.max_queued_per_user:
+            self._reject("Too many queued requests for this user")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), cost, time.monotonic())
+        self._enqueue(workspace_id, user_id, ROLE_WEIGHTS.get(role, DEFAULT_ROLE_WEIGHT), waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as we gave up: hand the slot back
+                self.release()
+            else:
+                waiter.future.cancel()
+                self._remove(workspace_id, user_id, waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject(f"Timed out after {self.queue_timeout:g}s in the generation queue")
+        wait_ms = (time.monotonic() - waiter.enqueued) * 1000
+        self._waits.append(wait_ms)
+        return Ticket(wait_ms=round(wait_ms, 3), queued=True)
+
+    def release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog is expected to drain"""
+        drain = (self.queued + 1) * self.service_ewma / max(self.max_concurrent, 1)
+        return max(1, math.ceil(drain))
+
+    def stats(self) -> Dict:
+        waits = sorted(self._waits)
+
+        def pct(q):
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))], 3) if waits else 0.0
+
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_wait_p50_ms": pct(0.50),
+            "queue_wait_p99_ms": pct(0.99),
+            "queued_by_workspace": {key: flow.backlog() for key, flow in self.workspaces.items()},
+        }
+
+    # ---------------------------------------------------------------- internal
+
+    def _reject(self, detail: str):
+        self.rejected += 1
+        raise QueueFullError(detail, self.retry_after())
+
+    def _enqueue(self, workspace_id: str, user_id: str, weight: float, waiter: _Waiter):
+        workspace = self.workspaces.get(workspace_id)
+        if workspace is None:
+            # Newly backlogged flows start at the current virtual time so
+            # idle periods do not bank credit
+            workspace = self.workspaces[workspace_id] = _Flow(workspace_id, pass_=self.vtime)
+        user = workspace.users.get(user_id)
+        if user is None:
+            user = workspace.users[user_id] = _Flow(user_id, weight=weight, pass_=workspace.vtime)
+        user.weight = max(user.weight, weight)
+        user.waiters.append(waiter)
+        self.queued += 1
+
+    def _remove(self, workspace_id: str, user_id: str, waiter: _Waiter):
+        workspace = self.workspaces.get(workspace_id)
+        user = workspace.users.get(user_id) if workspace else None
+        if user is None or waiter not in user.waiters:
+            return
+        user.waiters.remove(waiter)
+        self.queued -= 1
+        if not user.waiters:
+            del workspace.users[user_id]
+        if not workspace.users:
+            del self.workspaces[workspace_id]
+
+    def _dispatch(self):
+        while self.running < self.max_concurrent and self.queued:
+            workspace = min(self.workspaces.values(), key=lambda f: f.pass_)
+            user = min(workspace.users.values(), key=lambda f: f.pass_)
+            waiter = user.waiters.popleft()
+            self.queued -= 1
+
+            self.vtime = workspace.pass_
+            workspace.vtime = user.pass_
+            workspace_weight = max(u.weight for u in workspace.users.values())
+            workspace.pass_ += waiter.cost / workspace_weight
+            user.pass_ += waiter.cost / user.weight
+            if not user.waiters:
+                del workspace.users[user.key]
+            if not workspace.users:
+                del self.workspaces[workspace.key]
+
+            if waiter.future.done():
+                continue  # Cancelled while queued
+            self.running += 1
+            self.admitted += 1
+            waiter.future.set_result(True)
@@ -0,0 +1,238 @@
+"""
+EFHM Chat Sessions
+Server-side conversation history bounded by a token budget, with incremental
+summarization of older turns and reuse of retrieved context across turns
+"""
+
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, List, Optional
+import asyncio
+import logging
+import os
+import re
+import secrets
+import time
+
+from chunking import estimate_tokens
+from retrieval import SearchHit, tokenize
+
+logger = logging.getLogger("efhm.sessions")
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "400"))
+KEEP_RECENT_TURNS = int(os.getenv("KEEP_RECENT_TURNS", "4"))
+CONTEXT_REUSE_THRESHOLD = float(os.getenv("CONTEXT_REUSE_THRESHOLD", "0.6"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+# A single stored turn may use at most this share of the history budget
+MAX_TURN_TOKENS = HISTORY_TOKEN_BUDGET // (KEEP_RECENT_TURNS + 1)
+SESSION_SUMMARIZER = os.getenv("SESSION_SUMMARIZER", "extractive")
+
+@dataclass
+class Turn:
+    role: str  # "user" or "assistant"
+    text: str
+    tokens: int
+
+Summarizer = Callable[[str, List[Turn], int], Awaitable[str]]
+
+# ============================================================================
+# SUMMARIZERS
+# ============================================================================
+
+_SENTENCE = re.compile(r"[^.!?؟۔\n]+[.!?؟۔]?")
+
+def _truncate_tokens(text: str, budget: int, newest: bool = True) -> str:
+    """Keep the newest (or oldest) whole sentences of text that fit in the token budget"""
+    sentences = [s.strip() for s in _SENTENCE.findall(text) if s.strip()]
+    kept: List[str] = []
+    used = 0
+    for sentence in (reversed(sentences) if newest else sentences):
+        tokens = estimate_tokens(sentence)
+        if used + tokens > budget:
+            break
+        kept.append(sentence)
+        used += tokens
+    return " ".join(reversed(kept) if newest else kept)
+
+async def extractive_summarizer(previous: str, turns: List[Turn], budget: int) -> str:
+    """Fold evicted turns into the summary by keeping their first sentence; no model call"""
+    lines = [previous] if previous else []
+    for turn in turns:
+        first = next((s.strip() for s in _SENTENCE.findall(turn.text) if s.strip()), "")
+        if first:
+            lines.append(f"{turn.role}: {first}")
+    return _truncate_tokens(" ".join(lines), budget)
+
+class GeminiSummarizer:
+    """Incrementally rewrites the running summary with Gemini"""
+
+    def __init__(self, model: str = "gemini-2.0-flash-exp"):
+        self.model = model
+
+    async def __call__(self, previous: str, turns: List[Turn], budget: int) -> str:
+        import google.generativeai as genai
+
+        transcript = "\n".join(f"{t.role}: {t.text}" for t in turns)
+        prompt = f"""Update the running summary of a healthcare conversation.
+Keep clinical facts, codes, dates and open questions. Answer in the conversation's language.
+Use at most {budget} tokens.
+
+Current summary:
+{previous or "(none)"}
+
+New turns:
+{transcript}
+
+Updated summary:"""
+        try:
+            response = await genai.GenerativeModel(self.model).generate_content_async(prompt)
+            return _truncate_tokens(response.text, budget)
+        except Exception as e:
+            logger.error(f"Summarization failed, falling back to extractive: {str(e)}")
+            return await extractive_summarizer(previous, turns, budget)
+
+def create_summarizer(name: str = SESSION_SUMMARIZER) -> Summarizer:
+    if name == "gemini":
+        return GeminiSummarizer()
+    return extractive_summarizer
+
+# ============================================================================
+# SESSION
+# ============================================================================
+
+@dataclass
+class ChatSession:
+    session_id: str
+    user_id: str
+    workspace_id: str
+    summary: str = ""
+    summary_tokens: int = 0
+    turns: Deque[Turn] = field(default_factory=deque)
+    context_hits: List[SearchHit] = field(default_factory=list)
+    context_terms: set = field(default_factory=set)
+    turn_count: int = 0
+    last_active: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def history_tokens(self) -> int:
+        return self.summary_tokens + sum(t.tokens for t in self.turns)
+
+    def add_turn(self, role: str, text: str):
+        tokens = estimate_tokens(text)
+        if tokens > MAX_TURN_TOKENS:
+            text = _truncate_tokens(text, MAX_TURN_TOKENS, newest=False)
+            tokens = estimate_tokens(text)
+        self.turns.append(Turn(role=role, text=text, tokens=tokens))
+        self.last_active = time.monotonic()
+        if role == "user":
+            self.turn_count += 1
+
+    def context_covers(self, query: str) -> bool:
+        """Whether cached retrieval already covers the query's terms"""
+        if not self.context_hits:
+            return False
+        terms = set(tokenize(query))
+        if not terms:
+            return True
+        return len(terms & self.context_terms) / len(terms) >= CONTEXT_REUSE_THRESHOLD
+
+    def set_context(self, hits: List[SearchHit]):
+        self.context_hits = hits
+        self.context_terms = set()
+        for hit in hits:
+            self.context_terms.update(tokenize(hit.chunk.text))
+
+    def needs_compaction(self, budget: int = HISTORY_TOKEN_BUDGET) -> bool:
+        return self.history_tokens > budget and len(self.turns) > KEEP_RECENT_TURNS
+
+    async def compact(self, summarizer: Summarizer, budget: int = HISTORY_TOKEN_BUDGET):
+        """
+        Fold the oldest turns into the summary so history fits the budget.
+        Turns are only removed once the new summary exists, so a turn served
+        while summarization is in flight still sees the full history.
+        """
+        async with self.lock:
+            remaining = sum(t.tokens for t in self.turns)
+            evicted: List[Turn] = []
+            for turn in self.turns:
+                if len(self.turns) - len(evicted) <= KEEP_RECENT_TURNS or SUMMARY_TOKEN_BUDGET + remaining <= budget:
+                    break
+                evicted.append(turn)
+                remaining -= turn.tokens
+            if not evicted:
+                return
+            summary = await summarizer(self.summary, evicted, SUMMARY_TOKEN_BUDGET)
+            for _ in evicted:
+                self.turns.popleft()
+            self.summary = summary
+            self.summary_tokens = estimate_tokens(summary)
+            logger.info(
+                f"Compacted {len(evicted)} turns of session {self.session_id} "
+                f"({self.history_tokens} history tokens)"
+            )
+
+    def build_prompt(self, query: str, language: str, cultural_context: str, use_sources: bool = True) -> str:
+        """
+        Prompt with bounded history: running summary, recent turns, sources
+        (unless `use_sources` is off for this turn) and the new question, which
+        joins the history only once it is answered
+        """
+        parts = [
+            "You are a helpful assistant for BrainSAIT healthcare platform.",
+            f"Cultural context: {cultural_context}",
+            f"Language: {language}",
+        ]
+        if self.summary:
+            parts.append(f"\nConversation summary:\n{self.summary}")
+        if self.turns:
+            parts.append("\nRecent conversation:\n" + "\n".join(f"{t.role}: {t.text}" for t in self.turns))
+        if use_sources and self.context_hits:
+            sources = "\n\n".join(f"[{i}] {hit.chunk.text}" for i, hit in enumerate(self.context_hits, start=1))
+            parts.append(f"\nAnswer using the numbered sources below and cite them as [n].\n\nSources:\n{sources}")
+        parts.append(f"\nUser query: {query}\n\nProvide a helpful, accurate response in {language} language.")
+        return "\n".join(parts)
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class SessionStore:
+    """In-memory LRU of sessions with idle expiry (replace with Redis in production)"""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_active < self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+
+    def get(self, session_id: str, user_id: str) -> Optional[ChatSession]:
+        self._expire()
+        session = self._sessions.get(session_id)
+        if session is None or session.user_id != user_id:
+            return None
+        self._sessions.move_to_end(session_id)
+        session.last_active = time.monotonic()
+        return session
+
+    def create(self, user_id: str, workspace_id: str) -> ChatSession:
+        session = ChatSession(
+            session_id=f"sess_{secrets.token_hex(12)}",
+            user_id=user_id,
+            workspace_id=workspace_id,
+        )
+        self._sessions[session.session_id] = session
+        self._expire()
+        return session
+
+    def __len__(self) -> int:
+        return len(self._sessions)
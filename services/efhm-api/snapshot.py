@@ -0,0 +1,505 @@
+"""
+EFHM Workspace Snapshots
+Versioned, checksummed binary snapshots of workspace indexes, memory-mapped on
+startup instead of rebuilt from source documents
+"""
+
+from collections.abc import Sequence
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from chunking import Chunk
+from retrieval import WorkspaceIndex, create_embedder
+from vectors import WORKSPACE_ID_PATTERN, VectorStore, workspace_rescore_path
+
+logger = logging.getLogger("efhm.snapshot")
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")
+# "header" checks magic, version and the section table on load; "full" also
+# checksums every section, which reads the whole file
+SNAPSHOT_VERIFY = os.getenv("SNAPSHOT_VERIFY", "header")
+SNAPSHOT_SUFFIX = ".efhm"
+
+# File layout (little-endian):
+#   header    64 bytes: magic, format version, flags, section count, table offset, table crc32
+#   table     one entry per section: name, offset, length, crc32
+#   sections  each starting on a 64-byte boundary so arrays can be viewed in place
+MAGIC = b"EFHMSNAP"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<8sHHIQI")
+_SECTION = struct.Struct("<16sQQI4x")
+
+# One row per chunk; heading and document are ids into the string table, -1 for none
+CHUNK_ROW = np.dtype([
+    ("index", "<i4"),
+    ("start", "<i8"),
+    ("end", "<i8"),
+    ("token_count", "<i4"),
+    ("page_start", "<i4"),
+    ("page_end", "<i4"),
+    ("heading", "<i4"),
+    ("document", "<i4"),
+    ("length", "<i4"),
+])
+
+class SnapshotError(Exception):
+    """Raised for unreadable, corrupt or incompatible snapshots"""
+    pass
+
+def _term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _string_table(strings: Iterable[str]) -> Tuple[bytes, np.ndarray]:
+    """Concatenated UTF-8 strings plus n+1 byte offsets"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return b"".join(encoded), offsets
+
+def _check_workspace_id(workspace_id) -> str:
+    # Ids come from uploads and from snapshot files we did not write; they name files
+    if not isinstance(workspace_id, str) or not re.fullmatch(WORKSPACE_ID_PATTERN, workspace_id):
+        raise SnapshotError(f"Invalid workspace id: {workspace_id!r}")
+    return workspace_id
+
+def snapshot_path(directory: str, workspace_id: str) -> Path:
+    return Path(directory) / f"{_check_workspace_id(workspace_id)}{SNAPSHOT_SUFFIX}"
+
+# ============================================================================
+# WRITER
+# ============================================================================
+
+def export_snapshot(index: WorkspaceIndex, path: str, include_originals: bool = True) -> int:
+    """
+    Write a workspace index to `path` atomically and return its size in bytes.
+    Float32 originals of compact vectors are included when available so the
+    restored index can still rescore.
+    """
+    # Read every container under the index lock so a concurrent upload cannot
+    # leave the snapshot with more vector rows than chunk rows; the file
+    # itself is written after the lock is released
+    with index.lock:
+        sections = _index_sections(index, include_originals)
+    return _write_sections(Path(path), sections)
+
+def _index_sections(index: WorkspaceIndex, include_originals: bool) -> List[Tuple[str, object]]:
+    n = len(index)
+    chunks = [index.chunks[i] for i in range(n)]
+    strings: Dict[str, int] = {}
+    rows = np.zeros(n, dtype=CHUNK_ROW)
+    for i, chunk in enumerate(chunks):
+        heading = strings.setdefault(chunk.heading, len(strings)) if chunk.heading is not None else -1
+        document = strings.setdefault(index.document_ids[i], len(strings))
+        rows[i] = (chunk.index, chunk.start, chunk.end, chunk.token_count,
+                   chunk.page_start, chunk.page_end, heading, document, index.lengths[i])
+    text_blob, text_offsets = _string_table(c.text for c in chunks)
+    string_blob, string_offsets = _string_table(strings)
+
+    # Terms are ordered by 64-bit hash so lookups are a binary search over the mapped array
+    terms = sorted((_term_hash(term), term) for term in index.postings)
+    term_blob, term_offsets = _string_table(term for _, term in terms)
+    postings_offsets = np.zeros(len(terms) + 1, dtype="<u8")
+    ids: List[np.ndarray] = []
+    tfs: List[np.ndarray] = []
+    for i, (_, term) in enumerate(terms):
+        entry = index.postings[term]
+        chunk_ids = np.fromiter(sorted(entry), dtype="<i4", count=len(entry))
+        ids.append(chunk_ids)
+        tfs.append(np.fromiter((entry[c] for c in chunk_ids.tolist()), dtype="<u4", count=len(entry)))
+        postings_offsets[i + 1] = postings_offsets[i] + len(entry)
+
+    store = index.vectors
+    originals = None
+    if include_originals and store.dtype != "float32" and store.rescorable and store.size:
+        originals = store.full_precision(np.arange(store.size))
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "workspace_id": index.workspace_id,
+        "created_at": datetime.utcnow().isoformat(),
+        "chunks": n,
+        "strings": len(strings),
+        "terms": len(terms),
+        "postings": int(postings_offsets[-1]),
+        "total_length": index.total_length,
+        "embedder": type(index.embedder).__name__,
+        "dim": store.dim,
+        "vector_dtype": store.dtype,
+        "originals": originals is not None,
+    }
+    sections = [
+        ("meta", json.dumps(meta).encode("utf-8")),
+        ("chunks", rows),
+        ("text", text_blob),
+        ("text_offsets", text_offsets),
+        ("strings", string_blob),
+        ("string_offsets", string_offsets),
+        ("term_hashes", np.array([h for h, _ in terms], dtype="<u8")),
+        ("terms", term_blob),
+        ("term_offsets", term_offsets),
+        ("postings_offsets", postings_offsets),
+        ("postings_ids", np.concatenate(ids) if ids else np.zeros(0, dtype="<i4")),
+        ("postings_tf", np.concatenate(tfs) if tfs else np.zeros(0, dtype="<u4")),
+        ("codes", store.codes[:store.size]),
+        ("scales", store.scales[:store.size]),
+    ]
+    if originals is not None:
+        sections.append(("originals", originals))
+    return sections
+
+def _write_sections(path: Path, sections: List[Tuple[str, object]]) -> int:
+    payloads = [(name, data if isinstance(data, bytes) else np.ascontiguousarray(data).tobytes())
+                for name, data in sections]
+    table = bytearray()
+    offset = HEADER_SIZE + len(payloads) * _SECTION.size
+    layout = []
+    for name, data in payloads:
+        offset += -offset % ALIGNMENT
+        table += _SECTION.pack(name.encode("ascii"), offset, len(data), zlib.crc32(data))
+        layout.append((offset, data))
+        offset += len(data)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(payloads), HEADER_SIZE, zlib.crc32(table))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as handle:
+        handle.write(header.ljust(HEADER_SIZE, b"\0"))
+        handle.write(table)
+        for section_offset, data in layout:
+            handle.write(b"\0" * (section_offset - handle.tell()))
+            handle.write(data)
+        handle.flush()
+        os.fsync(handle.fileno())
+        size = handle.tell()
+    os.replace(tmp, path)
+    return size
+
+# ============================================================================
+# READER
+# ============================================================================
+
+class Snapshot:
+    """A memory-mapped snapshot file whose sections are zero-copy views into the mapping"""
+
+    def __init__(self, path: str, verify: bool = SNAPSHOT_VERIFY == "full"):
+        self.path = Path(path)
+        try:
+            with self.path.open("rb") as handle:
+                self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Cannot map {self.path}: {str(e)}")
+        if len(self._map) < HEADER_SIZE:
+            raise SnapshotError(f"{self.path} is truncated")
+        magic, version, _, count, table_offset, table_crc = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path} is not a workspace snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"{self.path} has format version {version}, expected {FORMAT_VERSION}")
+        table_end = table_offset + count * _SECTION.size
+        if table_end > len(self._map) or zlib.crc32(self._map[table_offset:table_end]) != table_crc:
+            raise SnapshotError(f"{self.path} has a corrupt section table")
+
+        self.sections: Dict[str, Tuple[int, int, int]] = {}
+        for i in range(count):
+            name, offset, length, crc = _SECTION.unpack_from(self._map, table_offset + i * _SECTION.size)
+            if offset + length > len(self._map):
+                raise SnapshotError(f"{self.path} is truncated")
+            self.sections[name.rstrip(b"\0").decode("ascii")] = (offset, length, crc)
+        self._view = memoryview(self._map)
+        self._check("meta")
+        self.meta = json.loads(bytes(self.section("meta")))
+        if verify:
+            self.verify()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._map)
+
+    def section(self, name: str) -> memoryview:
+        if name not in self.sections:
+            raise SnapshotError(f"{self.path} has no {name} section")
+        offset, length, _ = self.sections[name]
+        return self._view[offset:offset + length]
+
+    def array(self, name: str, dtype, shape: Optional[Tuple[int, ...]] = None) -> np.ndarray:
+        """Read-only array viewing a section in place"""
+        if name not in self.sections:
+            raise SnapshotError(f"{self.path} has no {name} section")
+        offset, length, _ = self.sections[name]
+        dtype = np.dtype(dtype)
+        array = (np.frombuffer(self._map, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+                 if length else np.zeros(0, dtype=dtype))
+        return array.reshape(shape) if shape else array
+
+    def _check(self, name: str):
+        offset, length, crc = self.sections[name]
+        if zlib.crc32(self._view[offset:offset + length]) != crc:
+            raise SnapshotError(f"{self.path} failed the checksum of section {name}")
+
+    def verify(self):
+        """Checksum every section; reads the whole file"""
+        for name in self.sections:
+            self._check(name)
+
+class MappedList(Sequence):
+    """Rows decoded on access from a snapshot, followed by rows appended after loading"""
+
+    def __init__(self, size: int, load: Callable[[int], object]):
+        self._size = size
+        self._load = load
+        self._tail: List[object] = []
+
+    def __len__(self) -> int:
+        return self._size + len(self._tail)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._load(i) if i < self._size else self._tail[i - self._size]
+
+    def append(self, item):
+        self._tail.append(item)
+
+class MappedPostings:
+    """
+    term -> {chunk_id: tf} over snapshot arrays. Terms are found by binary
+    search on their hash; writes copy the term's postings into an in-memory
+    overlay that shadows the mapped entry.
+    """
+
+    def __init__(self, snapshot: Snapshot):
+        self._hashes = snapshot.array("term_hashes", "<u8")
+        self._terms = snapshot.section("terms")
+        self._term_offsets = snapshot.array("term_offsets", "<u8")
+        self._offsets = snapshot.array("postings_offsets", "<u8")
+        self._ids = snapshot.array("postings_ids", "<i4")
+        self._tfs = snapshot.array("postings_tf", "<u4")
+        self._overlay: Dict[str, Dict[int, int]] = {}
+        self._added = 0  # overlay terms that are not in the snapshot
+
+    def _find(self, term: str) -> int:
+        h = _term_hash(term)
+        encoded = term.encode("utf-8")
+        i = int(np.searchsorted(self._hashes, np.uint64(h)))
+        while i < len(self._hashes) and int(self._hashes[i]) == h:
+            if self._terms[int(self._term_offsets[i]):int(self._term_offsets[i + 1])] == encoded:
+                return i
+            i += 1
+        return -1
+
+    def _entry(self, i: int) -> Dict[int, int]:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return dict(zip(self._ids[start:end].tolist(), self._tfs[start:end].tolist()))
+
+    def get(self, term: str, default=None) -> Optional[Dict[int, int]]:
+        entry = self._overlay.get(term)
+        if entry is not None:
+            return entry
+        i = self._find(term)
+        return self._entry(i) if i >= 0 else default
+
+    def __getitem__(self, term: str) -> Dict[int, int]:
+        entry = self.get(term)
+        if entry is None:
+            raise KeyError(term)
+        return entry
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._overlay or self._find(term) >= 0
+
+    def setdefault(self, term: str, default: Dict[int, int]) -> Dict[int, int]:
+        entry = self._overlay.get(term)
+        if entry is None:
+            i = self._find(term)
+            if i < 0:
+                self._added += 1
+            entry = self._overlay[term] = self._entry(i) if i >= 0 else default
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._hashes) + self._added
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self._hashes)):
+            yield str(self._terms[int(self._term_offsets[i]):int(self._term_offsets[i + 1])], "utf-8")
+        for term in self._overlay:
+            if self._find(term) < 0:
+                yield term
+
+    def items(self) -> Iterator[Tuple[str, Dict[int, int]]]:
+        for term in self:
+            yield term, self[term]
+
+def load_snapshot(path: str, embedder=None, verify: bool = SNAPSHOT_VERIFY == "full") -> WorkspaceIndex:
+    """Map a snapshot as a searchable WorkspaceIndex; nothing is decoded until it is used"""
+    snapshot = Snapshot(path, verify=verify)
+    meta = snapshot.meta
+    embedder = embedder or create_embedder()
+    # Same-dimension vectors from a different model would still "search", just wrongly
+    if type(embedder).__name__ != meta["embedder"] or embedder.dim != meta["dim"]:
+        raise SnapshotError(
+            f"{path} was built with {meta['embedder']} (dim {meta['dim']}), "
+            f"the configured embedder is {type(embedder).__name__} (dim {embedder.dim})"
+        )
+    rows = snapshot.array("chunks", CHUNK_ROW)
+    text = snapshot.section("text")
+    text_offsets = snapshot.array("text_offsets", "<u8")
+    strings = snapshot.section("strings")
+    string_offsets = snapshot.array("string_offsets", "<u8")
+
+    def string(i: int) -> Optional[str]:
+        if i < 0:
+            return None
+        return str(strings[int(string_offsets[i]):int(string_offsets[i + 1])], "utf-8")
+
+    def chunk(i: int) -> Chunk:
+        row = rows[i]
+        return Chunk(
+            index=int(row["index"]),
+            text=str(text[int(text_offsets[i]):int(text_offsets[i + 1])], "utf-8"),
+            start=int(row["start"]),
+            end=int(row["end"]),
+            token_count=int(row["token_count"]),
+            heading=string(int(row["heading"])),
+            page_start=int(row["page_start"]),
+            page_end=int(row["page_end"]),
+        )
+
+    n = meta["chunks"]
+    dtype = meta["vector_dtype"]
+    workspace_id = _check_workspace_id(meta["workspace_id"])
+    vectors = VectorStore.from_arrays(
+        snapshot.array("codes", dtype, (n, meta["dim"])),
+        snapshot.array("scales", "<f4"),
+        dtype,
+        originals=snapshot.array("originals", "<f4", (n, meta["dim"])) if meta["originals"] else None,
+        rescore_path=workspace_rescore_path(workspace_id, dtype),
+    )
+    return WorkspaceIndex.restore(
+        workspace_id,
+        chunks=MappedList(n, chunk),
+        document_ids=MappedList(n, lambda i: string(int(rows[i]["document"]))),
+        postings=MappedPostings(snapshot),
+        lengths=MappedList(n, lambda i: int(rows[i]["length"])),
+        total_length=meta["total_length"],
+        vectors=vectors,
+        embedder=embedder,
+    )
+
+def load_snapshot_dir(directory: str = SNAPSHOT_DIR,
+                      verify: bool = SNAPSHOT_VERIFY == "full") -> Dict[str, WorkspaceIndex]:
+    """Map every snapshot in a directory; corrupt or incompatible files are skipped"""
+    started = time.perf_counter()
+    embedder = create_embedder()
+    indexes: Dict[str, WorkspaceIndex] = {}
+    for path in sorted(Path(directory).glob(f"*{SNAPSHOT_SUFFIX}")):
+        try:
+            index = load_snapshot(str(path), embedder=embedder, verify=verify)
+        except (SnapshotError, KeyError, ValueError) as e:
+            logger.error(f"Skipping snapshot {path.name}: {str(e)}")
+            continue
+        indexes[index.workspace_id] = index
+    logger.info(
+        f"Mapped {len(indexes)} workspace snapshots from {directory} "
+        f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    return indexes
+
+def export_workspaces(indexes: Dict[str, WorkspaceIndex], directory: str = SNAPSHOT_DIR) -> Dict[str, int]:
+    """Snapshot every index into a directory; returns bytes written per workspace"""
+    written = {}
+    for workspace_id, index in indexes.items():
+        try:
+            path = snapshot_path(directory, workspace_id)
+        except SnapshotError as e:
+            logger.error(f"Skipping export of workspace: {str(e)}")
+            continue
+        written[workspace_id] = export_snapshot(index, str(path))
+    return written
+
+# ============================================================================
+# COMMANDS
+# ============================================================================
+
+def _build(args) -> Dict:
+    """Index source documents into a new workspace snapshot"""
+    from chunking import chunk_stream
+    from extraction import extract
+
+    target = snapshot_path(args.dir, args.workspace)
+    index = WorkspaceIndex(args.workspace, vector_dtype=args.vector_dtype, rescore=False)
+    for path in args.documents:
+        document_type = Path(path).suffix.lstrip(".").lower()
+        index.add_document(Path(path).name, chunk_stream(page.text for page in extract(path, document_type)))
+    return {"path": str(target), "chunks": len(index), "bytes": export_snapshot(index, str(target))}
+
+def _import(path: str, directory: str) -> Dict:
+    """Verify a snapshot, then install it into the snapshot directory atomically"""
+    snapshot = Snapshot(path, verify=True)
+    target = snapshot_path(directory, snapshot.meta["workspace_id"])
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    shutil.copyfile(path, tmp)
+    os.replace(tmp, target)
+    return {"path": str(target), "workspace_id": snapshot.meta["workspace_id"], "bytes": snapshot.nbytes}
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Build, inspect, verify and import workspace snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Index documents into a snapshot")
+    build.add_argument("--workspace", required=True)
+    build.add_argument("--dir", default=SNAPSHOT_DIR or ".")
+    build.add_argument("--vector-dtype", default="float32", choices=("float32", "float16", "int8"))
+    build.add_argument("documents", nargs="+")
+    info = commands.add_parser("info", help="Print snapshot metadata and sections")
+    info.add_argument("paths", nargs="+")
+    verify = commands.add_parser("verify", help="Checksum every section")
+    verify.add_argument("paths", nargs="+")
+    install = commands.add_parser("import", help="Verify and install snapshots into the snapshot directory")
+    install.add_argument("--dir", default=SNAPSHOT_DIR, required=not SNAPSHOT_DIR)
+    install.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(json.dumps(_build(args), indent=2))
+        sys.exit(0)
+
+    failed = False
+    for path in args.paths:
+        try:
+            if args.command == "import":
+                result = _import(path, args.dir)
+            else:
+                snapshot = Snapshot(path, verify=args.command == "verify")
+                result = {"path": path, "bytes": snapshot.nbytes, "meta": snapshot.meta}
+                if args.command == "info":
+                    result["sections"] = {name: length for name, (_, length, _) in snapshot.sections.items()}
+                else:
+                    result["verified"] = True
+        except SnapshotError as e:
+            failed = True
+            result = {"path": path, "error": str(e)}
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,81 @@
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+# Service modules are imported as top-level modules, as in main_improved.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chunking import chunk_text  # noqa: E402
+from retrieval import WorkspaceIndex  # noqa: E402
+
+# Small bilingual corpus shared by the retrieval and snapshot tests
+DOCS = {
+    "claims": "المادة 1\nيجب تقديم المطالبة خلال ثلاثين يوما من تاريخ الخدمة.\nClaims are submitted through NPHIES.",
+    "pharmacy": "# Formulary\nParacetamol is covered for all members. Aspirin needs prior approval.",
+    "appeals": "# Appeals\nRejected claims may be appealed within fifteen days of the rejection notice.",
+}
+
+@pytest.fixture(autouse=True)
+def rescore_dir(tmp_path, monkeypatch):
+    """Keep float32 originals of compact vector stores inside the test's tmp_path"""
+    path = tmp_path / "rescore"
+    monkeypatch.setattr("vectors.VECTOR_RESCORE_DIR", str(path))
+    return path
+
+@pytest.fixture
+def build_index():
+    """Factory indexing `docs` (the shared corpus by default) into a new workspace"""
+    def build(workspace_id="ws_test", dtype="float32", docs=None):
+        index = WorkspaceIndex(workspace_id, vector_dtype=dtype, rescore=dtype != "float32")
+        for document_id, text in (DOCS if docs is None else docs).items():
+            index.add_document(document_id, chunk_text(text, max_tokens=64, overlap_tokens=8))
+        return index
+    return build
+
+@pytest.fixture
+def index(build_index):
+    return build_index()
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel; records prompts, set `fail` to make generation raise"""
+    fail = False
+    prompts: list = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def generate_content_async(self, prompt):
+        FakeModel.prompts.append(prompt)
+        if FakeModel.fail:
+            raise RuntimeError("upstream error")
+        return types.SimpleNamespace(text="answer")
+
+@pytest.fixture
+def api(monkeypatch):
+    """The API module with generation faked and rate limiting out of the way"""
+    pytest.importorskip("google.generativeai")
+    pytest.importorskip("jwt")
+    import main_improved
+
+    monkeypatch.setattr(main_improved.genai, "GenerativeModel", FakeModel)
+    monkeypatch.setattr(main_improved, "RATE_LIMIT_CALLS", 10_000)
+    FakeModel.fail = False
+    FakeModel.prompts = []
+    return main_improved
+
+@pytest.fixture
+def client(api):
+    from fastapi.testclient import TestClient
+
+    return TestClient(api.app)
+
+@pytest.fixture
+def make_token(api):
+    """Factory signing a bearer token for a user and role"""
+    import jwt
+
+    def make(sub="u_test", role="user"):
+        return jwt.encode({"sub": sub, "role": role}, api.JWT_SECRET, algorithm=api.JWT_ALGORITHM)
+    return make
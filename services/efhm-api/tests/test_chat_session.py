@@ -0,0 +1,56 @@
+import logging
+
+import pytest
+
+def _connect(api, client, token, workspace_id="ws_sessions"):
+    return client.websocket_connect(f"/chat/ws?workspace_id={workspace_id}",
+                                    subprotocols=[api.WS_AUTH_SUBPROTOCOL, token])
+
+def test_token_in_query_string_is_rejected(client, make_token):
+    from starlette.websockets import WebSocketDisconnect
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/chat/ws?token={make_token()}&workspace_id=ws_sessions") as ws:
+            ws.receive_json()
+
+def test_bad_frame_keeps_session_open(api, client, make_token):
+    with _connect(api, client, make_token()) as ws:
+        assert ws.receive_json()["type"] == "session"
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"query": "What is NPHIES?", "language": "en"})
+        assert ws.receive_json()["type"] == "answer"
+
+def test_failed_turn_is_audited_and_not_kept(api, client, make_token, caplog):
+    with caplog.at_level(logging.INFO, logger="audit"), _connect(api, client, make_token("u_ws")) as ws:
+        session_id = ws.receive_json()["session_id"]
+        api.genai.GenerativeModel.fail = True
+        ws.send_json({"query": "first question", "language": "en"})
+        assert ws.receive_json()["type"] == "error"
+        api.genai.GenerativeModel.fail = False
+        ws.send_json({"query": "second question", "language": "en"})
+        reply = ws.receive_json()
+    assert reply["turn"] == 1
+    session = api.session_store.get(session_id, "u_ws")
+    assert [t.text for t in session.turns] == ["second question", "answer"]
+    audits = [r.msg for r in caplog.records if r.name == "audit" and r.msg["action"] == "chat.query"]
+    assert [a["success"] for a in audits] == [True, False, True]
+
+def test_use_rag_off_ignores_cached_sources(api, client, make_token):
+    from chunking import chunk_text
+
+    index = api.get_workspace_index("ws_rag_toggle")
+    index.add_document("claims", chunk_text("Claims are paid within thirty days of submission."))
+    question = {"query": "When are claims paid?", "language": "en"}
+    with _connect(api, client, make_token(), "ws_rag_toggle") as ws:
+        ws.receive_json()
+        replies = []
+        for use_rag in (True, False, True):
+            ws.send_json({**question, "use_rag": use_rag})
+            replies.append(ws.receive_json())
+    prompts = api.genai.GenerativeModel.prompts
+    assert replies[0]["citations"] and "Sources:" in prompts[0]
+    assert replies[1]["citations"] == [] and not replies[1]["context_reused"]
+    assert "Sources:" not in prompts[1]
+    # The cache survives a turn without RAG
+    assert replies[2]["context_reused"] and replies[2]["citations"] and "Sources:" in prompts[2]
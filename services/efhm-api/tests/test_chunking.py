@@ -0,0 +1,86 @@
+import pytest
+
+from chunking import chunk_stream, chunk_text, estimate_tokens, is_heading
+
+@pytest.mark.parametrize("line", [
+    "# Formulary",
+    "1. Introduction",
+    "1.2 Scope and Definitions",
+    "Section 3: Claims",
+    "Part II",
+    "IV. Appeals",
+    "المادة 2",
+    "المادة الأولى",
+    "الفصل الثالث: الأحكام العامة",
+])
+def test_headings(line):
+    assert is_heading(line)
+
+@pytest.mark.parametrize("line", [
+    "500 mg paracetamol every 6 hours",
+    "2 tablets twice daily",
+    "3 Tablets Daily",
+    "Part of the dose is lost",
+    "1\tAspirin\t100 mg",
+    "30 يوما من تاريخ الخدمة",
+])
+def test_dosage_and_list_lines_are_not_headings(line):
+    assert not is_heading(line)
+
+@pytest.mark.parametrize("line", [
+    "Section 5 of the policy requires that all",
+    "2 patients were excluded because of",
+    "المادة 5 من اللائحة تلزم مقدمي الخدمة",
+])
+def test_wrapped_pdf_lines_are_not_headings(line):
+    assert not is_heading(line)
+
+def _words(text):
+    return text.replace("#", " ").split()
+
+def test_numbered_list_keeps_every_row():
+    chunks = chunk_text("# Formulary\n1\tAspirin\t100 mg\n2\tIbuprofen\t200 mg\n3\tParacetamol\t500 mg\n\n")
+    assert len(chunks) == 1
+    assert chunks[0].heading == "# Formulary"
+    for drug in ("Aspirin", "Ibuprofen", "Paracetamol"):
+        assert drug in chunks[0].text
+
+def test_heading_without_body_is_kept_as_text():
+    chunks = chunk_text("# Chapter 1\n# 1.1 Scope\nClaims are filed within 30 days.\n# Appendix\n")
+    text = " ".join(c.text for c in chunks)
+    for heading in ("Chapter 1", "1.1 Scope", "Appendix"):
+        assert heading in text
+    assert chunks[1].heading == "# 1.1 Scope"
+
+def test_wrapped_pdf_page_keeps_all_text():
+    page = (
+        "Section 5 of the policy requires that all\n"
+        "claims are submitted electronically.\n"
+        "2 patients were excluded because of\n"
+        "missing records.\n"
+    )
+    chunks = chunk_text(page)
+    assert all(c.heading is None for c in chunks)
+    assert _words(" ".join(c.text for c in chunks)) == _words(page)
+
+def test_offsets_point_into_source():
+    text = "المادة 1\nيجب تقديم المطالبة خلال ثلاثين يوما. Claims must be complete.\n\nالمادة 2\nتراجع المطالبات أسبوعيا."
+    for chunk in chunk_text(text, max_tokens=20, overlap_tokens=4):
+        body = chunk.text.split("\n\n", 1)[-1] if chunk.heading else chunk.text
+        first = body.split()[0]
+        assert text[chunk.start:chunk.end].startswith(first)
+        assert text[chunk.start:chunk.end].endswith(body.split()[-1])
+
+def test_streamed_segments_match_whole_text():
+    text = "# Title\n" + " ".join(f"Sentence number {i} about claims." for i in range(200))
+    pieces = [text[i:i + 37] for i in range(0, len(text), 37)]
+    whole = [(c.text, c.start, c.end) for c in chunk_text(text, max_tokens=64, overlap_tokens=8)]
+    streamed = [(c.text, c.start, c.end) for c in chunk_stream(pieces, max_tokens=64, overlap_tokens=8)]
+    # Each segment counts as a page, so only text and offsets must agree
+    assert streamed == whole
+
+def test_chunks_respect_token_budget():
+    text = " ".join("يجب تقديم المطالبة خلال ثلاثين يوما من تاريخ الخدمة." for _ in range(100))
+    for chunk in chunk_text(text, max_tokens=64, overlap_tokens=8):
+        assert chunk.token_count <= 64
+        assert estimate_tokens(chunk.text) <= 64
@@ -0,0 +1,52 @@
+import re
+
+import pytest
+
+from chunking import chunk_stream
+from extraction import XLSX_ROWS_PER_BATCH, extract
+
+def _chunks(path, document_type):
+    return list(chunk_stream(page.text for page in extract(str(path), document_type)))
+
+def test_xlsx_rows_survive_chunking(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Formulary"
+    sheet.append(["Code", "Drug", "Dose"])
+    sheet.append([1, "Aspirin", "100 mg"])
+    sheet.append([2, "Ibuprofen", "200 mg"])
+    sheet.append([3, "Paracetamol", None])
+    path = tmp_path / "formulary.xlsx"
+    workbook.save(path)
+
+    chunks = _chunks(path, "xlsx")
+    text = "\n".join(c.text for c in chunks)
+    assert "Code: 1 | Drug: Aspirin | Dose: 100 mg." in text
+    assert "Code: 2 | Drug: Ibuprofen | Dose: 200 mg." in text
+    assert "Code: 3 | Drug: Paracetamol." in text
+    assert chunks[0].heading == "# Formulary"
+
+def test_xlsx_header_applies_across_batches(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Claims"
+    sheet.append(["Claim", "Amount"])
+    for i in range(XLSX_ROWS_PER_BATCH + 10):
+        sheet.append([f"CL{i}", i])
+    path = tmp_path / "claims.xlsx"
+    workbook.save(path)
+
+    text = "\n".join(c.text for c in _chunks(path, "xlsx"))
+    last = XLSX_ROWS_PER_BATCH + 9
+    assert f"Claim: CL{last} | Amount: {last}." in text
+    # Chunk overlap repeats some rows; every row must appear at least once
+    assert len(set(re.findall(r"Claim: CL\d+ \| Amount: \d+\.", text))) == XLSX_ROWS_PER_BATCH + 10
+
+def test_txt_round_trip(tmp_path):
+    path = tmp_path / "policy.txt"
+    path.write_text("المادة 1\nيجب تقديم المطالبة خلال ثلاثين يوما.\n", encoding="utf-8")
+    chunks = _chunks(path, "txt")
+    assert [c.heading for c in chunks] == ["المادة 1"]
+    assert "ثلاثين يوما" in chunks[0].text
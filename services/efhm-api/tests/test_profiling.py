@@ -0,0 +1,107 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from pathlib import Path
+
+from profiling import PROFILE_MAX_CONCURRENT, ProfileStore, ProfilingMiddleware
+
+def _save(store, n):
+    store.save(f"prof_{n:04x}", Counter({"main;handler": n + 1}), {"profile_id": f"prof_{n:04x}"})
+
+def test_save_prunes_beyond_max_count(tmp_path):
+    store = ProfileStore(str(tmp_path), max_count=3, max_age_hours=0)
+    for n in range(5):
+        _save(store, n)
+        # Distinct mtimes so the oldest is well defined
+        for suffix in (".json", ".folded"):
+            path = tmp_path / f"prof_{n:04x}{suffix}"
+            os.utime(path, (1000 + n, 1000 + n))
+    _save(store, 5)
+    kept = sorted(p["profile_id"] for p in store.list())
+    assert kept == ["prof_0003", "prof_0004", "prof_0005"]
+    assert len(list(tmp_path.glob("*.folded"))) == 3
+
+def test_save_prunes_expired(tmp_path):
+    store = ProfileStore(str(tmp_path), max_count=0, max_age_hours=1)
+    _save(store, 1)
+    old = time.time() - 2 * 3600
+    os.utime(tmp_path / "prof_0001.json", (old, old))
+    _save(store, 2)
+    assert [p["profile_id"] for p in store.list()] == ["prof_0002"]
+    assert store.path("prof_0001") is None
+
+def test_list_skips_profiles_pruned_meanwhile(tmp_path, monkeypatch):
+    store = ProfileStore(str(tmp_path), max_count=0, max_age_hours=0)
+    for n in range(3):
+        _save(store, n)
+    real_stat = Path.stat
+
+    def stat(path, *args, **kwargs):
+        # Another request's prune() removes this profile between glob and stat
+        if path.name == "prof_0001.json":
+            path.unlink(missing_ok=True)
+        return real_stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "stat", stat)
+    assert sorted(p["profile_id"] for p in store.list()) == ["prof_0000", "prof_0002"]
+
+# ============================================================================
+# MIDDLEWARE
+# ============================================================================
+
+def _request(path="/chat/query", token=None):
+    headers = [(b"x-efhm-profile", token)] if token else []
+    return {"type": "http", "method": "POST", "path": path, "headers": headers}
+
+def _run(middleware, scopes):
+    """Send each scope through the middleware concurrently; returns the response headers of each"""
+    async def call(scope):
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        await middleware(scope, receive, send)
+        return dict(sent[0]["headers"])
+
+    async def main():
+        return await asyncio.gather(*(call(scope) for scope in scopes))
+
+    return asyncio.run(main())
+
+def _app(delay=0.0):
+    async def app(scope, receive, send):
+        await asyncio.sleep(delay)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+def test_header_token_triggers_profile(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    middleware = ProfilingMiddleware(_app(0.02), store, token="secret", sample_rate=0, paths={"/chat/query"})
+    headers, = _run(middleware, [_request(token=b"secret")])
+    profile_id = headers[b"x-efhm-profile-id"].decode()
+    meta, = store.list()
+    assert meta["profile_id"] == profile_id
+    assert meta["trigger"] == "header" and meta["status"] == 200
+    assert store.path(profile_id).exists()
+
+def test_untriggered_requests_are_not_profiled(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    middleware = ProfilingMiddleware(_app(), store, token="secret", sample_rate=0, paths={"/chat/query"})
+    results = _run(middleware, [_request(token=b"wrong"), _request(), _request("/health", token=b"secret")])
+    assert all(b"x-efhm-profile-id" not in headers for headers in results)
+    assert store.list() == []
+
+def test_concurrent_profiles_are_capped(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    middleware = ProfilingMiddleware(_app(0.05), store, token="secret", sample_rate=0, paths={"/chat/query"})
+    results = _run(middleware, [_request(token=b"secret") for _ in range(PROFILE_MAX_CONCURRENT + 2)])
+    profiled = [headers for headers in results if b"x-efhm-profile-id" in headers]
+    assert len(profiled) == PROFILE_MAX_CONCURRENT
+    assert len(store.list()) == PROFILE_MAX_CONCURRENT
+    assert middleware.active == 0
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from chunking import chunk_text
+from retrieval import WorkspaceIndex, normalize, tokenize
+
+def test_arabic_normalization():
+    assert normalize("أَحْمَد") == normalize("احمد")
+    assert tokenize("والمطالبة") == ["مطالبه"]
+
+@pytest.mark.parametrize("mode", ["lexical", "dense", "hybrid"])
+def test_search_finds_relevant_document(index, mode):
+    hits = index.search("prior approval for Aspirin", top_k=3, mode=mode)
+    assert hits and hits[0].document_id == "pharmacy"
+
+def test_arabic_query_matches_folded_forms(index):
+    hits = index.search("متى يجب تقديم المطالبة؟", top_k=1, mode="lexical")
+    assert hits[0].document_id == "claims"
+    citation = hits[0].citation()
+    assert citation["heading"] == "المادة 1"
+    assert citation["start"] < citation["end"]
+
+def test_unknown_mode(index):
+    with pytest.raises(ValueError):
+        index.search("claims", mode="fuzzy")
+
+def test_search_while_indexing():
+    index = WorkspaceIndex("ws_race", vector_dtype="int8", rescore=False)
+    chunks = chunk_text(" ".join(f"Claim {i} needs approval within {i} days." for i in range(400)),
+                        max_tokens=24, overlap_tokens=4)
+    errors = []
+    done = threading.Event()
+
+    def writer():
+        try:
+            for start in range(0, len(chunks), 5):
+                index.add_document(f"doc_{start}", chunks[start:start + 5], batch_size=2)
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+        finally:
+            done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    while not done.is_set():
+        try:
+            for mode in ("lexical", "dense", "hybrid"):
+                for hit in index.search("claim approval days", top_k=10, mode=mode):
+                    assert hit.chunk is index.chunks[hit.chunk_id]
+        except Exception as e:
+            errors.append(e)
+            break
+    thread.join()
+    assert not errors
+    assert len(index) == len(index.vectors) == len(index.lengths) == len(chunks)
+
+def test_add_document_indexes_a_stream_in_batches():
+    index = WorkspaceIndex("ws_stream", vector_dtype="float32", rescore=False)
+    chunks = chunk_text(" ".join(f"Claim {i} needs approval within {i} days." for i in range(200)),
+                        max_tokens=24, overlap_tokens=4)
+
+    def stream():
+        for produced, chunk in enumerate(chunks):
+            # Earlier batches are already searchable; at most one batch is buffered
+            assert len(index) >= produced - 8
+            yield chunk
+
+    index.add_document("doc_stream", stream(), batch_size=8)
+    assert len(index) == len(index.vectors) == len(chunks)
+    assert [c.index for c in index.chunks] == [c.index for c in chunks]
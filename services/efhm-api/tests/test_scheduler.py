@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from scheduler import AdmissionController, QueueFullError
+
+async def _run(controller, user_id, workspace_id, role, order, hold=0.005):
+    async with controller.slot(user_id, workspace_id, role):
+        order.append((workspace_id, user_id))
+        await asyncio.sleep(hold)
+
+def test_admits_immediately_below_capacity():
+    async def main():
+        controller = AdmissionController(max_concurrent=2)
+        async with controller.slot("u1", "ws_a") as ticket:
+            assert not ticket.queued and ticket.wait_ms == 0
+            assert controller.running == 1
+        assert controller.running == 0
+    asyncio.run(main())
+
+def test_workspaces_share_slots_fairly():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queue_depth=100, max_queued_per_user=100)
+        order = []
+        # A busy tenant enqueues first; a second tenant must not wait behind all of it
+        busy = [asyncio.create_task(_run(controller, "bulk", "ws_busy", "user", order)) for _ in range(20)]
+        await asyncio.sleep(0)
+        quiet = [asyncio.create_task(_run(controller, "nurse", "ws_quiet", "user", order)) for _ in range(3)]
+        await asyncio.gather(*busy, *quiet)
+        positions = [i for i, (ws, _) in enumerate(order) if ws == "ws_quiet"]
+        assert positions[-1] < 10
+    asyncio.run(main())
+
+def test_role_weights_within_workspace():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queue_depth=100, max_queued_per_user=100)
+        order = []
+        holder = asyncio.create_task(_run(controller, "first", "ws_a", "user", order, hold=0.02))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(_run(controller, "batch", "ws_a", "batch", order)) for _ in range(8)]
+        tasks += [asyncio.create_task(_run(controller, "doctor", "ws_a", "healthcare_professional", order))
+                  for _ in range(8)]
+        await asyncio.gather(holder, *tasks)
+        # The 4x weighted clinician gets about four slots for every batch slot
+        first_eight = [user for _, user in order[1:9]]
+        assert first_eight.count("doctor") >= 6
+    asyncio.run(main())
+
+def test_rejects_when_queue_full():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queue_depth=2, max_queued_per_user=10)
+        order = []
+        tasks = [asyncio.create_task(_run(controller, f"u{i}", "ws_a", "user", order, hold=0.05)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(QueueFullError) as rejected:
+            await controller.acquire("late", "ws_a")
+        assert rejected.value.retry_after >= 1
+        await asyncio.gather(*tasks)
+        assert controller.stats()["rejected"] == 1
+    asyncio.run(main())
+
+def test_rejects_beyond_per_user_limit():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queue_depth=10, max_queued_per_user=1)
+        order = []
+        holder = asyncio.create_task(_run(controller, "u1", "ws_a", "user", order, hold=0.05))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(_run(controller, "u1", "ws_a", "user", order))
+        await asyncio.sleep(0.01)
+        with pytest.raises(QueueFullError):
+            await controller.acquire("u1", "ws_a")
+        # Another user still gets in line
+        await asyncio.gather(holder, waiting, _run(controller, "u2", "ws_a", "user", order))
+    asyncio.run(main())
+
+def test_queue_timeout_and_cancellation_release_state():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, queue_timeout=0.05)
+        order = []
+        holder = asyncio.create_task(_run(controller, "u1", "ws_a", "user", order, hold=0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError, match="0.05s"):
+            await controller.acquire("u2", "ws_a")
+        cancelled = asyncio.create_task(controller.acquire("u3", "ws_b"))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert controller.queued == 0 and not controller.workspaces
+        await holder
+        assert controller.running == 0
+    asyncio.run(main())
+
+def test_admission_stats_are_admin_only(client, make_token):
+    response = client.get("/admin/admission", headers={"Authorization": f"Bearer {make_token(role='user')}"})
+    assert response.status_code == 403
+    response = client.get("/admin/admission", headers={"Authorization": f"Bearer {make_token(role='admin')}"})
+    assert response.status_code == 200
+    assert {"running", "queued", "rejected"} <= set(response.json())
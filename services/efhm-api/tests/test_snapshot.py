@@ -0,0 +1,136 @@
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from chunking import chunk_text
+from retrieval import HashingEmbedder
+from snapshot import (Snapshot, SnapshotError, _import, export_snapshot, export_workspaces, load_snapshot,
+                      load_snapshot_dir, snapshot_path)
+
+QUERIES = ["prior approval for Aspirin", "متى يجب تقديم المطالبة؟", "appeal a rejected claim"]
+
+def ranked(index, query, mode):
+    return [(hit.chunk_id, hit.document_id, round(hit.score, 5)) for hit in index.search(query, top_k=5, mode=mode)]
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+@pytest.mark.parametrize("mode", ["lexical", "dense", "hybrid"])
+def test_mapped_index_searches_like_original(tmp_path, dtype, mode, build_index):
+    index = build_index(dtype=dtype)
+    path = str(tmp_path / "ws_snap.efhm")
+    export_snapshot(index, path)
+    loaded = load_snapshot(path, embedder=index.embedder, verify=True)
+    assert len(loaded) == len(index)
+    assert loaded.total_length == index.total_length
+    for query in QUERIES:
+        assert ranked(loaded, query, mode) == ranked(index, query, mode)
+    hit = loaded.search("prior approval for Aspirin", top_k=1, mode=mode)[0]
+    original = index.chunks[hit.chunk_id]
+    assert hit.chunk.text == original.text
+    assert (hit.chunk.heading, hit.chunk.start, hit.chunk.end) == (original.heading, original.start, original.end)
+
+def test_originals_are_stored_for_compact_vectors(tmp_path, build_index):
+    index = build_index(dtype="int8")
+    path = str(tmp_path / "ws_snap.efhm")
+    export_snapshot(index, path)
+    assert Snapshot(path).meta["originals"]
+    export_snapshot(index, path, include_originals=False)
+    assert not Snapshot(path).meta["originals"]
+
+def test_append_after_load_and_reexport(tmp_path, build_index):
+    index = build_index()
+    path = str(tmp_path / "ws_snap.efhm")
+    export_snapshot(index, path)
+    loaded = load_snapshot(path, embedder=index.embedder)
+    extra = "# Dental\nOrthodontic treatment requires a referral from a dentist."
+    loaded.add_document("dental", chunk_text(extra, max_tokens=64, overlap_tokens=8))
+    index.add_document("dental", chunk_text(extra, max_tokens=64, overlap_tokens=8))
+    assert loaded.search("orthodontic referral", top_k=1, mode="lexical")[0].document_id == "dental"
+
+    # Re-exporting a mapped index over its own file must not read from the replaced mapping
+    export_snapshot(loaded, path)
+    reloaded = load_snapshot(path, embedder=index.embedder, verify=True)
+    assert len(reloaded) == len(index)
+    for mode in ("lexical", "dense", "hybrid"):
+        for query in QUERIES + ["orthodontic referral"]:
+            assert ranked(reloaded, query, mode) == ranked(index, query, mode)
+
+def test_corruption_is_detected(tmp_path, build_index):
+    index = build_index()
+    path = tmp_path / "ws_snap.efhm"
+    export_snapshot(index, str(path))
+    offset = Snapshot(str(path)).sections["text"][0]
+    data = bytearray(path.read_bytes())
+    data[offset] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(SnapshotError):
+        load_snapshot(str(path), embedder=index.embedder, verify=True)
+
+def test_embedder_mismatch_is_skipped(tmp_path, build_index):
+    class OtherEmbedder(HashingEmbedder):
+        pass
+
+    index = build_index("ws_snap")
+    path = str(snapshot_path(str(tmp_path), "ws_snap"))
+    export_snapshot(index, path)
+    other = OtherEmbedder()
+    assert other.dim == index.embedder.dim
+    with pytest.raises(SnapshotError, match="OtherEmbedder"):
+        load_snapshot(path, embedder=other)
+
+    assert list(load_snapshot_dir(str(tmp_path))) == ["ws_snap"]
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr("snapshot.create_embedder", OtherEmbedder)
+        assert load_snapshot_dir(str(tmp_path)) == {}
+
+def test_export_during_indexing_is_consistent(tmp_path, build_index):
+    index = build_index(docs={f"base_{i}": f"Benefit {i} is limited to {i} visits per year." for i in range(300)})
+
+    def writer():
+        for i in range(200):
+            text = f"Policy {i} covers procedure code {i * 7}."
+            index.add_document(f"doc_{i}", chunk_text(text, max_tokens=64, overlap_tokens=8))
+
+    # Switch threads often so uploads land in the middle of an export
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    thread = threading.Thread(target=writer)
+    try:
+        thread.start()
+        path = str(tmp_path / "ws_snap.efhm")
+        while thread.is_alive():
+            export_snapshot(index, path)
+            snapshot = Snapshot(path)
+            n = snapshot.meta["chunks"]
+            assert snapshot.array("codes", snapshot.meta["vector_dtype"]).size == n * snapshot.meta["dim"]
+            assert snapshot.array("scales", "<f4").size == n
+            assert snapshot.array("text_offsets", "<u8").size == n + 1
+            assert int(np.max(snapshot.array("postings_ids", "<i4"), initial=-1)) < n
+    finally:
+        thread.join()
+        sys.setswitchinterval(switch_interval)
+
+@pytest.mark.parametrize("workspace_id", ["../../escaped", "ws_a/../../b", "ws_a\n", ""])
+def test_snapshot_path_rejects_invalid_ids(tmp_path, workspace_id):
+    with pytest.raises(SnapshotError):
+        snapshot_path(str(tmp_path), workspace_id)
+
+def test_export_skips_invalid_workspace_ids(tmp_path, build_index):
+    directory = tmp_path / "snapshots"
+    index = build_index("ws_ok")
+    written = export_workspaces({"ws_ok": index, "../../escaped": index}, str(directory))
+    assert list(written) == ["ws_ok"]
+    assert [p.name for p in tmp_path.rglob("*.efhm")] == ["ws_ok.efhm"]
+
+def test_import_rejects_snapshot_naming_another_path(tmp_path, build_index):
+    index = build_index("ws_ok")
+    index.workspace_id = "../escaped"  # as written by someone else's exporter
+    source = tmp_path / "incoming.efhm"
+    export_snapshot(index, str(source))
+    directory = tmp_path / "snapshots" / "installed"
+    with pytest.raises(SnapshotError, match="Invalid workspace id"):
+        _import(str(source), str(directory))
+    with pytest.raises(SnapshotError, match="Invalid workspace id"):
+        load_snapshot(str(source), embedder=index.embedder)
+    assert [p.name for p in tmp_path.rglob("*.efhm")] == ["incoming.efhm"]
@@ -0,0 +1,115 @@
+import contextlib
+import json
+import time
+
+import pytest
+
+from timing import JsonLinesExporter, StageTimer, TimingExporter, summarize, timing_record
+
+def test_stage_timer_accumulates_and_freezes():
+    timer = StageTimer()
+    with timer.span("retrieval"):
+        time.sleep(0.002)
+    timer.add("queue", 1.5)
+    timer.add("queue", 1.0)
+    timings = timer.finish()
+    assert timings["queue"] == 2.5
+    assert timings["retrieval"] >= 2
+    assert timings["total"] >= timings["retrieval"]
+    time.sleep(0.002)
+    assert timer.as_dict() == timings
+    assert timer.server_timing() == ", ".join(f"{name};dur={value}" for name, value in timings.items())
+
+def test_exporter_base_is_abstract():
+    with pytest.raises(TypeError):
+        TimingExporter()
+
+def _wait_for_lines(path, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if path.exists() and len(path.read_text(encoding="utf-8").splitlines()) >= count:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"{path} did not reach {count} lines")
+
+def test_jsonl_export_and_summary(tmp_path):
+    path = tmp_path / "timings.jsonl"
+    exporter = JsonLinesExporter(str(path), max_mb=0)
+    for ms in range(1, 101):
+        timer = StageTimer()
+        timer.add("generation", float(ms))
+        exporter.export(timing_record("chat.query", timer))
+    exporter.export(timing_record("documents.upload", StageTimer()))
+    _wait_for_lines(path, 101)
+    summary = summarize(str(path), route="chat.query")
+    assert summary["generation"]["count"] == 100
+    assert summary["generation"]["p50"] == 51.0
+    assert summary["generation"]["p99"] == 100.0
+
+def test_jsonl_export_rotates_at_size_limit(tmp_path):
+    path = tmp_path / "timings.jsonl"
+    exporter = JsonLinesExporter(str(path), max_mb=0.001)  # about 1 KB
+    for _ in range(3):
+        for _ in range(20):
+            exporter.export(timing_record("chat.query", StageTimer(), padding="x" * 40))
+        _wait_for_lines(path, 1)
+        time.sleep(0.05)
+    rotated = tmp_path / "timings.jsonl.1"
+    assert rotated.exists()
+    # Only the live file and one rotation are ever kept
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["timings.jsonl", "timings.jsonl.1"]
+    for line in rotated.read_text(encoding="utf-8").splitlines():
+        assert json.loads(line)["route"] == "chat.query"
+
+# ============================================================================
+# ROUTES
+# ============================================================================
+
+@pytest.fixture
+def chat(api, client, make_token, monkeypatch):
+    monkeypatch.setattr(api, "GEMINI_API_KEY", "test")
+
+    def post(**fields):
+        return client.post(
+            "/chat/query",
+            headers={"Authorization": f"Bearer {make_token()}"},
+            json={"query": "What is NPHIES?", "workspace_id": "ws_timing", "language": "en", **fields},
+        )
+    return post
+
+def _stages(response):
+    return {part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")}
+
+def test_chat_query_reports_timings(chat):
+    response = chat(include_timings=True)
+    assert response.status_code == 200
+    assert {"auth", "rate_limit", "audit", "prompt", "queue", "generation", "total"} <= _stages(response)
+    assert set(response.json()["timings"]) == _stages(response)
+    assert chat().json()["timings"] is None
+
+def test_chat_query_errors_carry_server_timing(api, chat, monkeypatch):
+    api.genai.GenerativeModel.fail = True
+    response = chat()
+    assert response.status_code == 500
+    assert {"auth", "generation", "total"} <= _stages(response)
+
+    @contextlib.asynccontextmanager
+    async def full(*args, **kwargs):
+        raise api.QueueFullError("Generation queue is full", retry_after=3)
+        yield
+
+    monkeypatch.setattr(api.admission, "slot", full)
+    response = chat()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+    assert {"auth", "prompt", "total"} <= _stages(response)
+
+def test_upload_errors_carry_server_timing(client, make_token):
+    response = client.post(
+        "/documents/upload",
+        headers={"Authorization": f"Bearer {make_token()}"},
+        files={"file": ("broken.pdf", b"%PDF-1.4 not really a pdf", "application/pdf")},
+        data={"workspace_id": "ws_timing", "metadata": '{"document_type": "pdf"}'},
+    )
+    assert response.status_code == 422
+    assert {"read", "audit", "extract_chunk", "total"} <= _stages(response)
@@ -0,0 +1,29 @@
+import pytest
+
+def _upload(client, make_token, text, workspace_id="ws_upload", **params):
+    return client.post(
+        "/documents/upload",
+        params=params,
+        headers={"Authorization": f"Bearer {make_token()}"},
+        files={"file": ("policy.txt", text.encode("utf-8"), "text/plain")},
+        data={"workspace_id": workspace_id, "metadata": '{"document_type": "txt"}'},
+    )
+
+def test_upload_indexes_document(api, client, make_token):
+    text = "\n\n".join(f"Article {i}\nClaims for service {i} are paid within {i + 10} days." for i in range(1, 150))
+    response = _upload(client, make_token, text, include_timings=True)
+    assert response.status_code == 200
+    body = response.json()
+    index = api.workspace_indexes["ws_upload"]
+    assert body["chunks"] > 64 and len(index) >= body["chunks"]
+    assert body["pages"] >= 1
+    assert {"extract_chunk", "index", "total"} <= set(body["timings"])
+    assert response.headers["Server-Timing"].startswith("auth;dur=")
+    hits = index.search("service 42 paid", top_k=1, mode="lexical")
+    assert hits[0].document_id == body["document_id"]
+
+@pytest.mark.parametrize("workspace_id", ["../../escaped", "ws_a/../b", "other", ""])
+def test_upload_rejects_invalid_workspace_id(api, client, make_token, workspace_id):
+    response = _upload(client, make_token, "Claims are paid within 30 days.", workspace_id=workspace_id)
+    assert response.status_code == 422
+    assert workspace_id not in api.workspace_indexes
@@ -0,0 +1,91 @@
+import gc
+import os
+
+import numpy as np
+import pytest
+
+from retrieval import WorkspaceIndex
+from vectors import VectorStore, workspace_rescore_path
+
+DIM = 32
+
+def _vectors(n, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_int8_encoding_is_symmetric_per_vector():
+    store = VectorStore(DIM, "int8")
+    vectors = np.vstack([_vectors(20), np.zeros((1, DIM), dtype=np.float32)])
+    codes, scales = store.encode(vectors)
+    assert codes.dtype == np.int8 and scales.dtype == np.float32
+    assert np.abs(codes[:-1]).max(axis=1).tolist() == [127] * 20
+    np.testing.assert_allclose(scales[:-1], np.abs(vectors[:-1]).max(axis=1) / 127, rtol=1e-6)
+    assert scales[-1] == 1.0 and not codes[-1].any()
+    # Dequantized values are within half a quantization step
+    assert (np.abs(codes * scales[:, None] - vectors) <= scales[:, None] / 2 + 1e-7).all()
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_growth_across_adds_keeps_rows(dtype):
+    store = VectorStore(DIM, dtype)
+    batches = [_vectors(n, seed=n) for n in (50, 30, 100, 1)]
+    for batch in batches:
+        store.add(batch)
+    vectors = np.vstack(batches)
+    assert len(store) == len(vectors) == 181
+    assert len(store.codes) >= len(store) and store.nbytes == 181 * store.bytes_per_vector
+    query = vectors[77]
+    tolerance = {"float32": 1e-5, "float16": 1e-2, "int8": 5e-2}[dtype]
+    np.testing.assert_allclose(store.scores(query), vectors @ query, atol=tolerance)
+    ids, _ = store.search(query, k=1)
+    assert ids[0] == 77
+
+def test_int8_rescore_reads_originals_from_disk(rescore_dir):
+    path = rescore_dir / "ws_vectors.f32"
+    store = VectorStore(DIM, "int8", rescore_path=str(path))
+    vectors = _vectors(300)
+    store.add(vectors[:100])
+    query = vectors[10]
+    store.search(query, k=5)
+    store.add(vectors[100:])  # the memmap must be reopened at the new size
+    assert path.stat().st_size == 300 * DIM * 4
+    np.testing.assert_array_equal(store.full_precision(np.array([250, 3])), vectors[[250, 3]])
+    ids, scores = store.search(vectors[250], k=5)
+    exact = vectors @ vectors[250]
+    assert ids.tolist() == np.argsort(-exact)[:5].tolist()
+    np.testing.assert_allclose(scores, exact[ids], rtol=1e-6)
+
+def test_from_arrays_writes_originals_on_first_add(rescore_dir):
+    vectors = _vectors(40)
+    source = VectorStore(DIM, "int8")
+    source.add(vectors)
+    path = rescore_dir / "ws_mapped.f32"
+    store = VectorStore.from_arrays(source.codes[:40], source.scales[:40], "int8",
+                                    originals=vectors, rescore_path=str(path))
+    assert store.rescorable and not path.exists()
+    extra = _vectors(5, seed=1)
+    store.add(extra)
+    assert path.stat().st_size == 45 * DIM * 4
+    np.testing.assert_array_equal(store.full_precision(np.arange(45)), np.vstack([vectors, extra]))
+
+def test_rescore_file_is_removed_with_its_store(rescore_dir):
+    path = rescore_dir / "ws_gone.f32"
+    store = VectorStore(DIM, "int8", rescore_path=str(path))
+    store.add(_vectors(3))
+    assert path.exists()
+    del store
+    gc.collect()
+    assert not path.exists()
+
+def test_rescore_path_is_per_process(rescore_dir):
+    path = workspace_rescore_path("ws_a", "int8")
+    assert os.path.dirname(path) == str(rescore_dir)
+    assert os.path.basename(path) == f"ws_a.{os.getpid()}.f32"
+    assert workspace_rescore_path("ws_a", "float32") is None
+
+@pytest.mark.parametrize("workspace_id", ["../../escaped", "ws_a/../../b", "ws_a\n", "", "/tmp/ws_a"])
+def test_workspace_ids_cannot_escape_rescore_dir(rescore_dir, workspace_id):
+    with pytest.raises(ValueError):
+        workspace_rescore_path(workspace_id, "int8")
+    with pytest.raises(ValueError):
+        WorkspaceIndex(workspace_id, vector_dtype="int8")
+    assert not list(rescore_dir.parent.parent.glob("escaped*"))
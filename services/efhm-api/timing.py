@@ -0,0 +1,190 @@
+"""
+EFHM Stage Timing
+Lightweight per-request spans, Server-Timing headers and pluggable exporters
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger("efhm.timing")
+
+TIMING_EXPORTER = os.getenv("TIMING_EXPORTER", "jsonl")
+TIMING_EXPORT_PATH = os.getenv("TIMING_EXPORT_PATH", "/tmp/efhm-timings.jsonl")
+TIMING_EXPORT_MAX_MB = float(os.getenv("TIMING_EXPORT_MAX_MB", "50"))
+
+# ============================================================================
+# SPANS
+# ============================================================================
+
+class StageTimer:
+    """Collects named stage durations (ms) for a single request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.finished_ms: Optional[float] = None
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, duration_ms: float):
+        # Repeated stages (e.g. per-turn retrieval) accumulate
+        self.stages[name] = round(self.stages.get(name, 0.0) + duration_ms, 3)
+
+    def total_ms(self) -> float:
+        if self.finished_ms is not None:
+            return self.finished_ms
+        return round((time.perf_counter() - self.started) * 1000, 3)
+
+    def finish(self) -> Dict[str, float]:
+        """Freeze the total so header, response and export agree"""
+        self.finished_ms = self.total_ms()
+        return self.as_dict()
+
+    def as_dict(self) -> Dict[str, float]:
+        return {**self.stages, "total": self.total_ms()}
+
+    def server_timing(self) -> str:
+        """Render stages as a Server-Timing header value"""
+        return ", ".join(f"{name};dur={duration}" for name, duration in self.as_dict().items())
+
+def get_stage_timer(request) -> StageTimer:
+    """Return the request-scoped StageTimer, creating it on first use"""
+    timer = getattr(request.state, "stage_timer", None)
+    if timer is None:
+        timer = StageTimer()
+        request.state.stage_timer = timer
+    return timer
+
+# ============================================================================
+# EXPORTERS
+# ============================================================================
+
+class TimingExporter(ABC):
+    """Base exporter; subclasses receive one record per finished request"""
+
+    @abstractmethod
+    def export(self, record: Dict[str, Any]):
+        """Accept a record without blocking the request"""
+
+class NullExporter(TimingExporter):
+    def export(self, record: Dict[str, Any]):
+        pass
+
+class JsonLinesExporter(TimingExporter):
+    """
+    Append records to a local JSON-lines file from a background thread.
+    Once the file reaches `max_mb` it is rotated to `<path>.1`, replacing the
+    previous rotation, so at most about twice `max_mb` is kept (0 disables).
+    """
+
+    def __init__(self, path: str = TIMING_EXPORT_PATH, max_mb: float = TIMING_EXPORT_MAX_MB):
+        self.path = Path(path)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._queue: "queue.SimpleQueue[Dict[str, Any]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="efhm-timing-export", daemon=True)
+        self._thread.start()
+
+    def export(self, record: Dict[str, Any]):
+        self._queue.put(record)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._rotate()
+                with self.path.open("a", encoding="utf-8") as handle:
+                    handle.write(json.dumps(record) + "\n")
+                    # Drain whatever else is queued while the file is open
+                    while True:
+                        try:
+                            handle.write(json.dumps(self._queue.get_nowait()) + "\n")
+                        except queue.Empty:
+                            break
+            except OSError as e:
+                logger.error(f"Failed to export timings: {str(e)}")
+
+    def _rotate(self):
+        if self.max_bytes <= 0:
+            return
+        try:
+            if self.path.stat().st_size < self.max_bytes:
+                return
+        except FileNotFoundError:
+            return
+        os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+
+EXPORTERS: Dict[str, Callable[[], TimingExporter]] = {
+    "jsonl": JsonLinesExporter,
+    "none": NullExporter,
+}
+
+def register_exporter(name: str, factory: Callable[[], TimingExporter]):
+    """Register a custom exporter selectable through TIMING_EXPORTER"""
+    EXPORTERS[name] = factory
+
+def create_exporter(name: str = TIMING_EXPORTER) -> TimingExporter:
+    factory = EXPORTERS.get(name)
+    if factory is None:
+        logger.warning(f"Unknown timing exporter {name}, timings will not be exported")
+        return NullExporter()
+    return factory()
+
+def timing_record(route: str, timer: StageTimer, success: bool = True, **extra: Any) -> Dict[str, Any]:
+    """Build the exported record for a finished request"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "route": route,
+        "success": success,
+        "stages": timer.as_dict(),
+        **extra,
+    }
+
+def summarize(path: str = TIMING_EXPORT_PATH, route: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """Aggregate exported JSON-lines into p50/p95/p99 per stage"""
+    durations: Dict[str, list] = {}
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            record = json.loads(line)
+            if route and record.get("route") != route:
+                continue
+            for stage, value in record["stages"].items():
+                durations.setdefault(stage, []).append(value)
+
+    def pct(values, q):
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    summary = {}
+    for stage, values in durations.items():
+        values.sort()
+        summary[stage] = {
+            "count": len(values),
+            "p50": pct(values, 0.50),
+            "p95": pct(values, 0.95),
+            "p99": pct(values, 0.99),
+        }
+    return summary
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize exported stage timings")
+    parser.add_argument("path", nargs="?", default=TIMING_EXPORT_PATH)
+    parser.add_argument("--route")
+    args = parser.parse_args()
+    print(json.dumps(summarize(args.path, args.route), indent=2))
@@ -0,0 +1,186 @@
+"""
+EFHM Vector Storage
+Compact float16 / scalar-int8 embedding arrays with optional exact rescoring
+"""
+
+from pathlib import Path
+from typing import Optional, Tuple
+import logging
+import os
+import re
+import weakref
+
+import numpy as np
+
+logger = logging.getLogger("efhm.vectors")
+
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")
+VECTOR_RESCORE_DIR = os.getenv("VECTOR_RESCORE_DIR", "/tmp/efhm-vectors")
+RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", "4"))
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+# Workspace ids become file names (rescoring originals, snapshots), so they are
+# validated against this pattern wherever they reach the filesystem
+WORKSPACE_ID_PATTERN = r'^ws_[a-zA-Z0-9_-]+$'
+
+# Rows widened to float32 at a time while scoring compact codes; small blocks
+# stay in cache, which matters more than BLAS call overhead here
+SCORE_BLOCK_ROWS = 2048
+
+class VectorStore:
+    """
+    Append-only embedding matrix kept in one contiguous array.
+
+    `float16` halves memory; `int8` stores one signed byte per dimension plus
+    a float32 scale per vector (symmetric scalar quantization), a ~4x saving.
+    Search runs over the compact form. When `rescore_path` is set, the
+    float32 originals are appended to that file and the top candidates are
+    rescored exactly from a memory map of it, so RAM holds only the codes.
+    The store owns that file: it is truncated on creation and removed when the
+    store is garbage collected or the process exits.
+    """
+
+    def __init__(self, dim: int, dtype: str = VECTOR_DTYPE, rescore_path: Optional[str] = None):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype: {dtype}")
+        self.dim = dim
+        self.dtype = dtype
+        self.codes = np.zeros((0, dim), dtype=np.dtype(dtype))
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.size = 0
+        self.rescore_path = Path(rescore_path) if rescore_path and dtype != "float32" else None
+        self._full: Optional[np.memmap] = None
+        self._mapped_full: Optional[np.ndarray] = None  # originals mapped from a snapshot
+        self._cleanup: Optional[weakref.finalize] = None
+        if self.rescore_path:
+            self._own_rescore_file(b"")
+
+    @classmethod
+    def from_arrays(cls, codes: np.ndarray, scales: np.ndarray, dtype: str,
+                    originals: Optional[np.ndarray] = None, rescore_path: Optional[str] = None) -> "VectorStore":
+        """
+        Wrap existing (e.g. memory-mapped, read-only) arrays without copying.
+        `originals` are float32 vectors used for rescoring; on the first add
+        they are written to `rescore_path` so later appends stay on disk.
+        """
+        store = cls(codes.shape[1], dtype)
+        store.codes, store.scales, store.size = codes, scales, len(codes)
+        if dtype != "float32":
+            store._mapped_full = originals
+            store.rescore_path = Path(rescore_path) if rescore_path and originals is not None else None
+        return store
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _own_rescore_file(self, data: bytes):
+        """Replace the rescoring file with `data` and remove it along with the store"""
+        self.rescore_path.parent.mkdir(parents=True, exist_ok=True)
+        self.rescore_path.write_bytes(data)
+        if self._cleanup is None:
+            self._cleanup = weakref.finalize(self, self.rescore_path.unlink, missing_ok=True)
+
+    @property
+    def rescorable(self) -> bool:
+        return self.rescore_path is not None or self._mapped_full is not None
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.codes.itemsize * self.dim + (4 if self.dtype == "int8" else 0)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes of the compact form (excludes the on-disk originals)"""
+        return self.size * self.bytes_per_vector
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+            return codes, scales.astype(np.float32)
+        return vectors.astype(self.dtype), np.ones(len(vectors), dtype=np.float32)
+
+    def add(self, vectors: np.ndarray):
+        codes, scales = self.encode(vectors)
+        if self._mapped_full is not None:
+            if self.rescore_path:
+                self._own_rescore_file(np.ascontiguousarray(self._mapped_full[:self.size]).tobytes())
+            self._mapped_full = None
+        needed = self.size + len(codes)
+        if needed > len(self.codes):
+            # Grow geometrically so appends stay amortized O(1)
+            capacity = max(needed, 2 * len(self.codes), 64)
+            grown = np.zeros((capacity, self.dim), dtype=self.codes.dtype)
+            grown[:self.size] = self.codes[:self.size]
+            grown_scales = np.zeros(capacity, dtype=np.float32)
+            grown_scales[:self.size] = self.scales[:self.size]
+            self.codes, self.scales = grown, grown_scales
+        self.codes[self.size:needed] = codes
+        self.scales[self.size:needed] = scales
+        self.size = needed
+        if self.rescore_path:
+            with self.rescore_path.open("ab") as handle:
+                handle.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            self._full = None
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate dot-product scores of every stored vector against a query"""
+        query = np.asarray(query, dtype=np.float32)
+        if self.dtype == "float32":
+            return self.codes[:self.size] @ query
+        out = np.empty(self.size, dtype=np.float32)
+        block = np.empty((min(SCORE_BLOCK_ROWS, self.size), self.dim), dtype=np.float32)
+        for start in range(0, self.size, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, self.size)
+            rows = block[:end - start]
+            np.copyto(rows, self.codes[start:end], casting="unsafe")
+            out[start:end] = rows @ query
+        if self.dtype == "int8":
+            out *= self.scales[:self.size]
+        return out
+
+    def full_precision(self, ids: np.ndarray) -> Optional[np.ndarray]:
+        """Read float32 originals for the given rows from the rescoring file"""
+        if self._mapped_full is not None:
+            full = self._mapped_full
+        elif self.rescore_path:
+            if self._full is None or len(self._full) != self.size:
+                self._full = np.memmap(self.rescore_path, dtype=np.float32, mode="r", shape=(self.size, self.dim))
+            full = self._full
+        else:
+            return None
+        # Read rows in file order for locality, then restore the requested order
+        order = np.argsort(ids)
+        rows = np.empty((len(ids), self.dim), dtype=np.float32)
+        rows[order] = full[ids[order]]
+        return rows
+
+    def search(self, query: np.ndarray, k: int, rescore: bool = True,
+               rescore_factor: int = RESCORE_FACTOR) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, scores) of the top-k vectors, best first"""
+        if not self.size or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self.scores(query)
+        exact = rescore and self.rescorable
+        pool = min(self.size, k * rescore_factor if exact else k)
+        ids = np.argpartition(-scores, pool - 1)[:pool]
+        if exact:
+            scores = self.full_precision(ids) @ np.asarray(query, dtype=np.float32)
+        else:
+            scores = scores[ids]
+        order = np.argsort(-scores)[:k]
+        return ids[order], scores[order]
+
+def workspace_rescore_path(workspace_id: str, dtype: str) -> Optional[str]:
+    """
+    On-disk location of a workspace's float32 originals, if rescoring applies.
+    Every worker process builds its own index, so the file is per process.
+    """
+    if not re.fullmatch(WORKSPACE_ID_PATTERN, workspace_id):
+        raise ValueError(f"Invalid workspace id: {workspace_id!r}")
+    if dtype == "float32" or not VECTOR_RESCORE_DIR:
+        return None
+    return str(Path(VECTOR_RESCORE_DIR) / f"{workspace_id}.{os.getpid()}.f32")